@@ -0,0 +1,95 @@
+import os
+import time
+import argparse
+import tempfile
+import statistics
+import contextlib
+from .standin_server import StandInServer
+from src.image_engine import HEDGE_PERCENTILE
+from src.image_manager import download_images_async, download_images_threaded
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def max_requests_per_window(times, window=1.0):
+    best = 0
+    start = 0
+    for end in range(len(times)):
+        while times[end] - times[start] > window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+def run_engine(engine, count, latency, jitter, error_rate=0.0, throttle_above_rps=None,
+               slow_rate=0.0, slow_latency=2.0, hedge_percentile=HEDGE_PERCENTILE):
+    # "hedged" is the async engine with a second stand-in server (no slow tail, no errors) as its mirror.
+    jobs = [(str(100000 + i), 100000 + i) for i in range(count)]
+    latencies = []
+    server = StandInServer(
+        latency=latency, jitter=jitter, error_rate=error_rate, throttle_above_rps=throttle_above_rps,
+        slow_rate=slow_rate, slow_latency=slow_latency, seed=0
+    )
+    mirror = StandInServer(latency=latency, jitter=jitter, seed=1)
+    with server, mirror, tempfile.TemporaryDirectory() as output_dir:
+        url_template = server.base_url + "/images/cards_cropped/{image_id}.jpg"
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            if engine == "threaded":
+                success, failed = download_images_threaded(jobs, output_dir, url_template, latencies)
+            elif engine == "hedged":
+                sources = [url_template, mirror.base_url + "/images/cards_cropped/{image_id}.jpg"]
+                success, failed = download_images_async(
+                    jobs, output_dir, sources, latencies, hedge_percentile=hedge_percentile
+                )
+            else:
+                success, failed = download_images_async(jobs, output_dir, url_template, latencies)
+        elapsed = time.perf_counter() - start
+        request_log = server.request_log + mirror.request_log
+        times = sorted(entry[0] for entry in request_log)
+        rejected = sum(1 for entry in request_log if entry[2] != 200)
+
+    span = times[-1] - times[0] if len(times) > 1 else 0.0
+    return {
+        "engine": engine,
+        "success": success,
+        "failed": len(failed),
+        "requests": len(times),
+        "rejected": rejected,
+        "seconds": elapsed,
+        "sustained_rps": (len(times) - 1) / span if span else 0.0,
+        "peak_rps_1s": max_requests_per_window(times),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare image download engines against a local stand-in CDN.")
+    parser.add_argument("--images", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.15, help="base server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.35, help="extra uniform random latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--throttle-above", type=int, default=None, help="answer 429 above this many req/s")
+    parser.add_argument("--slow-rate", type=float, default=0.0,
+                        help="fraction of primary requests delayed by --slow-latency (a slow tail)")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="extra seconds of a slow request")
+    parser.add_argument("--hedge-percentile", type=float, default=HEDGE_PERCENTILE,
+                        help="latency percentile after which the hedged engine asks the mirror")
+    parser.add_argument("--engines", nargs="+", default=["threaded", "async"], choices=["threaded", "async", "hedged"])
+    args = parser.parse_args()
+
+    print(f"{'engine':>9} {'ok':>5} {'fail':>5} {'reqs':>5} {'rej':>5} {'seconds':>8} {'req/s':>7} {'peak 1s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for engine in args.engines:
+        r = run_engine(
+            engine, args.images, args.latency, args.jitter, args.error_rate, args.throttle_above,
+            args.slow_rate, args.slow_latency, args.hedge_percentile
+        )
+        print(f"{r['engine']:>9} {r['success']:>5} {r['failed']:>5} {r['requests']:>5} {r['rejected']:>5} "
+              f"{r['seconds']:>8.2f} {r['sustained_rps']:>7.2f} "
+              f"{r['peak_rps_1s']:>8} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import json
+import filecmp
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+from .synthetic import generate_json_sources
+
+def run_child(mode, tmp_dir, output_path, res_dir):
+    # Runs one generate_cards_json mode in this process and reports its peak RSS.
+    from src.card_processor import generate_cards_json
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        generate_cards_json(tmp_dir, output_path, res_dir, streaming=(mode == "streaming"))
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "seconds": elapsed, "peak_rss_kb": peak_kb}))
+
+def measure(mode, tmp_dir, output_path, res_dir):
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.ingest_memory", "--child", mode, tmp_dir, output_path, res_dir],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare peak memory of in-memory and streaming cards.json generation.")
+    parser.add_argument("--cards", type=int, nargs="+", default=[5000, 20000, 50000])
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "TMP_DIR", "OUTPUT", "RES_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    print(f"{'cards':>8} {'input MB':>9} {'mode':>10} {'seconds':>8} {'peak RSS MB':>12}")
+    for count in args.cards:
+        with tempfile.TemporaryDirectory() as work_dir:
+            json1_path, json2_path = generate_json_sources(work_dir, count)
+            input_mb = (os.path.getsize(json1_path) + os.path.getsize(json2_path)) / 1e6
+            res_dir = os.path.join(work_dir, "res")
+            outputs = {}
+            for mode in ["memory", "streaming"]:
+                outputs[mode] = os.path.join(work_dir, f"cards-{mode}.json")
+                stats = measure(mode, work_dir, outputs[mode], res_dir)
+                print(f"{count:>8} {input_mb:>9.1f} {mode:>10} {stats['seconds']:>8.2f} {stats['peak_rss_kb'] / 1024:>12.1f}")
+            if not filecmp.cmp(outputs["memory"], outputs["streaming"], shallow=False):
+                print(f"Warning: outputs differ for {count} cards.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from src.card_processor import is_int, is_str
+from src.card_schema import CardDataError, describe_card, type_name
+
+# The per-field require_type validation card_processor used before src/card_schema.py,
+# kept only as the reference the suite's validate_cards benchmark compares against.
+
+def require_type(obj, field_name, expected_type, context):
+    if field_name not in obj:
+        raise CardDataError(f"{context}: missing required field '{field_name}'")
+
+    value = obj[field_name]
+    if expected_type == "str" and not is_str(value):
+        raise CardDataError(f"{context}: field '{field_name}' expected str, got {type_name(value)}")
+    if expected_type == "int" and not is_int(value):
+        raise CardDataError(f"{context}: field '{field_name}' expected int, got {type_name(value)}")
+    if expected_type == "list" and not isinstance(value, list):
+        raise CardDataError(f"{context}: field '{field_name}' expected list, got {type_name(value)}")
+    return value
+
+def require_optional_type(obj, field_name, expected_type, context):
+    if field_name not in obj:
+        return None
+    return require_type(obj, field_name, expected_type, context)
+
+def validate_json2_card(card, source_key):
+    context = f"json2 entry {source_key}"
+    if not isinstance(card, dict):
+        raise CardDataError(f"{context}: expected object, got {type_name(card)}")
+
+    require_type(card, "id", "int", context)
+    require_type(card, "cn_name", "str", context)
+    text = card.get("text", {})
+    if text is None:
+        raise CardDataError(f"{context}: field 'text' expected object, got null")
+    if not isinstance(text, dict):
+        raise CardDataError(f"{context}: field 'text' expected object, got {type_name(text)}")
+    for field_name in ["desc", "pdesc", "types"]:
+        if field_name in text:
+            require_type(text, field_name, "str", context)
+
+def validate_json1_card(card, index):
+    if not isinstance(card, dict):
+        raise CardDataError(f"json1 data[{index}]: expected object, got {type_name(card)}")
+
+    context = describe_card(card)
+    require_type(card, "id", "int", context)
+    card_images = require_type(card, "card_images", "list", context)
+    if not card_images:
+        raise CardDataError(f"{context}: field 'card_images' must not be empty")
+    for image_index, image in enumerate(card_images):
+        image_context = f"{context} card_images[{image_index}]"
+        if not isinstance(image, dict):
+            raise CardDataError(f"{image_context}: expected object, got {type_name(image)}")
+        require_type(image, "id", "int", image_context)
+
+    frame_type = require_type(card, "frameType", "str", context)
+    if frame_type in ["spell", "trap"]:
+        require_type(card, "race", "str", context)
+        return
+
+    is_link = "link" in frame_type.lower()
+    is_pendulum = "pendulum" in frame_type.lower()
+    require_type(card, "attribute", "str", context)
+    require_type(card, "atk", "int", context)
+    if is_link:
+        require_type(card, "linkval", "int", context)
+        linkmarkers = require_type(card, "linkmarkers", "list", context)
+        for marker_index, marker in enumerate(linkmarkers):
+            if not is_str(marker):
+                raise CardDataError(
+                    f"{context}: field 'linkmarkers[{marker_index}]' expected str, got {type_name(marker)}"
+                )
+    else:
+        require_type(card, "def", "int", context)
+        require_type(card, "level", "int", context)
+    require_optional_type(card, "scale", "int", context)
+    if is_pendulum and "scale" not in card:
+        raise CardDataError(f"{context}: missing required field 'scale'")
+
+    typeline = card.get("typeline")
+    if "typeline" in card and not isinstance(typeline, list):
+        raise CardDataError(f"{context}: field 'typeline' expected list, got {type_name(typeline)}")
+    if typeline and not is_str(typeline[0]):
+        raise CardDataError(f"{context}: field 'typeline[0]' expected str, got {type_name(typeline[0])}")
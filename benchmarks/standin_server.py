@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import shutil
+import random
+import hashlib
+import threading
+import http.server
+
+IMAGE_PATH = re.compile(r"^/images/cards_cropped/(\d+)\.jpg$")
+
+def fake_image_bytes(image_id, size):
+    # Deterministic per-id payload so repeated runs and dedup checks see stable content.
+    seed = hashlib.sha256(str(image_id).encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+class StandInServer:
+    # Local keep-alive server standing in for the image CDN and, through files, the data sources (ETag/304, HEAD).
+    # request_log holds (arrived, path, status, body bytes); error_rate, throttle_above_rps and slow_rate inject faults.
+
+    def __init__(self, latency=0.05, jitter=0.0, image_size=20000, seed=0,
+                 error_rate=0.0, throttle_above_rps=None, retry_after=1, files=None,
+                 slow_rate=0.0, slow_latency=2.0):
+        self.files = dict(files or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.image_size = image_size
+        self.error_rate = error_rate
+        self.throttle_above_rps = throttle_above_rps
+        self.retry_after = retry_after
+        self.recent_arrivals = []
+        self.rng = random.Random(seed)
+        self.request_log = []
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    def delay(self):
+        with self.lock:
+            extra = self.rng.random() * self.jitter if self.jitter else 0.0
+            if self.slow_rate and self.rng.random() < self.slow_rate:
+                extra += self.slow_latency
+        return self.latency + extra
+
+    def admit(self, arrived):
+        # Returns the status to force for this request, or None to serve it normally.
+        with self.lock:
+            if self.throttle_above_rps is not None:
+                self.recent_arrivals = [t for t in self.recent_arrivals if arrived - t < 1.0]
+                self.recent_arrivals.append(arrived)
+                if len(self.recent_arrivals) > self.throttle_above_rps:
+                    return 429
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return 503
+        return None
+
+    def log(self, arrived, path, status, size=0):
+        with self.lock:
+            self.request_log.append((arrived, path, status, size))
+
+    def make_handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            head_only = False
+
+            def do_GET(self):
+                self.arrived = time.monotonic()
+                forced = server.admit(self.arrived)
+                time.sleep(server.delay())
+                if forced == 429:
+                    self.respond(429, b"", headers={"Retry-After": str(server.retry_after)})
+                    return
+                if forced is not None:
+                    self.respond(forced, b"")
+                    return
+                if self.path in server.files:
+                    self.send_file(server.files[self.path])
+                    return
+                match = IMAGE_PATH.match(self.path)
+                if not match:
+                    self.respond(404, b"")
+                    return
+                self.respond(200, fake_image_bytes(match.group(1), server.image_size), "image/jpeg")
+
+            def do_HEAD(self):
+                # Same status and headers as GET, without the body (upstream polling probes).
+                # The handler serves every request of a keep-alive connection, so reset the flag.
+                self.head_only = True
+                try:
+                    self.do_GET()
+                finally:
+                    self.head_only = False
+
+            def respond(self, status, body, content_type="application/octet-stream", headers=None):
+                server.log(self.arrived, self.path, status, 0 if self.head_only else len(body))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not self.head_only:
+                    self.wfile.write(body)
+
+            def send_file(self, path):
+                stat = os.stat(path)
+                etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.respond(304, b"", headers={"ETag": etag})
+                    return
+                server.log(self.arrived, self.path, 200, 0 if self.head_only else stat.st_size)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(stat.st_size))
+                self.end_headers()
+                if self.head_only:
+                    return
+                with open(path, 'rb') as f:
+                    shutil.copyfileobj(f, self.wfile, 1 << 20)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        self.base_url = self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+from .synthetic import generate_upstream, synthetic_card_ids
+from .standin_server import StandInServer
+
+# Offline benchmark suite: synthetic upstream data served by local stand-in servers,
+# each benchmark in its own process so peak RSS is its own. Results go to a JSON file
+# and can be compared against a stored baseline.
+
+BENCHMARKS = ["generate_cards_json", "process_json2", "download_images", "validate_cards"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def validate_compiled(json1_cards, json2_items):
+    from src.card_schema import (
+        CardDataError, frame_validator, json1_context, validate_json1_frame_type, validate_json1_identity,
+        validate_json2_fields, validate_json2_text
+    )
+    errors = 0
+    for source_key, card in json2_items:
+        context = lambda: f"json2 entry {source_key}"
+        try:
+            if not isinstance(card, dict):
+                raise CardDataError(f"{context()}: expected object")
+            validate_json2_fields(card, context)
+            validate_json2_text(card.get("text", {}), context)
+        except CardDataError:
+            errors += 1
+    for index, card in enumerate(json1_cards):
+        try:
+            if not isinstance(card, dict):
+                raise CardDataError(f"json1 data[{index}]: expected object")
+            context = json1_context(card)
+            validate_json1_identity(card, context)
+            validate_json1_frame_type(card, context)
+            frame_validator(card["frameType"])[1](card, context)
+        except CardDataError:
+            errors += 1
+    return errors
+
+def validate_legacy(json1_cards, json2_items):
+    from src.card_schema import CardDataError
+    from .legacy_validation import validate_json1_card, validate_json2_card
+    errors = 0
+    for source_key, card in json2_items:
+        try:
+            validate_json2_card(card, source_key)
+        except CardDataError:
+            errors += 1
+    for index, card in enumerate(json1_cards):
+        try:
+            validate_json1_card(card, index)
+        except CardDataError:
+            errors += 1
+    return errors
+
+def best_time(function, *args, repeat=3):
+    # Fastest of repeat runs; returns (seconds, result).
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+def run_child(name, work_dir, files_url, images_url, images):
+    # Runs one benchmark in this process; prints its measurements as one JSON line.
+    result = {}
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        start = time.perf_counter()
+        if name == "generate_cards_json":
+            from src.card_processor import generate_cards_json
+            output_path = os.path.join(work_dir, "cards.json")
+            generate_cards_json(os.path.join(work_dir, "tmp"), output_path, os.path.join(work_dir, "res"))
+            with open(os.path.join(work_dir, "tmp", "json1.json"), 'rb') as f:
+                result["items"] = json.load(f)["meta"]["total_rows"]
+            result["bytes"] = os.path.getsize(output_path)
+        elif name == "process_json2":
+            from src import data_manager
+            data_manager.JSON2_ZIP_URL = files_url + "/cards.zip"
+            data_manager.JSON2_MD5_URL = files_url + "/cards.zip.md5"
+            out_dir = tempfile.mkdtemp(dir=work_dir)
+            data_manager.process_json2(out_dir)
+            result["bytes"] = os.path.getsize(os.path.join(work_dir, "www", "cards.zip"))
+            result["items"] = None
+        elif name == "download_images":
+            from src.card_processor import write_cards_json
+            from src.image_manager import download_images
+            cards_path = os.path.join(work_dir, "image-cards.json")
+            card_ids = synthetic_card_ids(images, 1)
+            write_cards_json({str(card_id): {"id": card_id, "cardImage": card_id} for card_id in card_ids}, cards_path)
+            fig_dir = tempfile.mkdtemp(dir=work_dir)
+            download_images(cards_path, fig_dir, url_template=images_url + "/images/cards_cropped/{image_id}.jpg")
+            result["items"] = len([n for n in os.listdir(fig_dir) if n.endswith(".png")])
+            result["bytes"] = sum(os.path.getsize(os.path.join(fig_dir, n)) for n in os.listdir(fig_dir))
+        elif name == "validate_cards":
+            # Compiled card_schema validators against the old per-field require_type checks.
+            json1_path = os.path.join(work_dir, "tmp", "json1.json")
+            json2_path = os.path.join(work_dir, "tmp", "json2.json")
+            with open(json1_path, 'r', encoding='utf-8') as f:
+                json1_cards = json.load(f)["data"]
+            with open(json2_path, 'r', encoding='utf-8') as f:
+                json2_items = list(json.load(f).items())
+            result["seconds"], compiled_errors = best_time(validate_compiled, json1_cards, json2_items)
+            result["legacy_seconds"], legacy_errors = best_time(validate_legacy, json1_cards, json2_items)
+            if compiled_errors != legacy_errors:
+                raise RuntimeError(f"validators disagree: {compiled_errors} vs {legacy_errors} errors")
+            result["items"] = len(json1_cards) + len(json2_items)
+            result["bytes"] = os.path.getsize(json1_path) + os.path.getsize(json2_path)
+        else:
+            raise ValueError(f"unknown benchmark {name}")
+        result.setdefault("seconds", time.perf_counter() - start)
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(result))
+
+def measure(name, work_dir, files_url, images_url, images):
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--child", name, work_dir, files_url, images_url, str(images)],
+        check=True, capture_output=True, text=True
+    )
+    stats = json.loads(completed.stdout.strip().splitlines()[-1])
+    seconds = stats["seconds"]
+    measured = {
+        "seconds": seconds,
+        "peak_rss_mb": stats["peak_rss_kb"] / 1024,
+        "items": stats["items"],
+        "items_per_s": stats["items"] / seconds if stats["items"] and seconds else None,
+        "mb_per_s": stats["bytes"] / 1e6 / seconds if seconds else None
+    }
+    if "legacy_seconds" in stats:
+        measured["legacy_seconds"] = stats["legacy_seconds"]
+        measured["speedup"] = stats["legacy_seconds"] / seconds if seconds else None
+    return measured
+
+def compare(results, baseline, tolerance):
+    """
+    Prints each benchmark against the baseline; returns the names that regressed
+    (throughput down or peak memory up by more than tolerance).
+    """
+    regressions = []
+    print(f"\n{'benchmark':<22} {'seconds':>14} {'peak RSS MB':>16} {'MB/s':>16}")
+    for name, current in results["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if old is None:
+            print(f"{name:<22} (no baseline)")
+            continue
+
+        def change(key):
+            if not old.get(key) or current.get(key) is None:
+                return 0.0, "n/a"
+            ratio = current[key] / old[key] - 1
+            return ratio, f"{current[key]:.2f} ({ratio:+.0%})"
+
+        seconds_change, seconds_text = change("seconds")
+        memory_change, memory_text = change("peak_rss_mb")
+        speed_change, speed_text = change("mb_per_s")
+        print(f"{name:<22} {seconds_text:>14} {memory_text:>16} {speed_text:>16}")
+        if speed_change < -tolerance or memory_change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against synthetic data and local stand-in servers.")
+    parser.add_argument("--cards", type=int, default=13000, help="synthetic json1 cards (13000 today, up to 500000)")
+    parser.add_argument("--images", type=int, default=300, help="images for the download_images benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="image server latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="extra uniform random image latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of image requests answered with 503")
+    parser.add_argument("--throttle-above", type=int, default=None, help="answer image requests with 429 above this req/s")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--output", default="benchmark-results.json", help="results file to write")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="fail if the baseline file is missing")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression before failing")
+    parser.add_argument("--child", nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        name, work_dir, files_url, images_url, images = args.child
+        run_child(name, work_dir, files_url, images_url, int(images))
+        return
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": {
+            "cards": args.cards, "images": args.images, "latency": args.latency, "jitter": args.jitter,
+            "error_rate": args.error_rate, "throttle_above": args.throttle_above
+        },
+        "benchmarks": {}
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"Generating synthetic upstream data for {args.cards} cards...")
+        files = generate_upstream(work_dir, args.cards)
+        routes = {"/" + os.path.basename(path): path for path in files.values()}
+        files_server = StandInServer(latency=0.0, files=routes)
+        images_server = StandInServer(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            throttle_above_rps=args.throttle_above
+        )
+        with files_server, images_server:
+            for name in args.only:
+                print(f"Running {name}...")
+                stats = measure(name, work_dir, files_server.base_url, images_server.base_url, args.images)
+                results["benchmarks"][name] = stats
+                throughput = f"{stats['items_per_s']:.0f} items/s, " if stats["items_per_s"] else ""
+                print(f"  {stats['seconds']:.2f}s, {throughput}{stats['mb_per_s']:.1f} MB/s, "
+                      f"peak RSS {stats['peak_rss_mb']:.1f} MB")
+                if stats.get("speedup"):
+                    print(f"  {stats['speedup']:.2f}x faster than per-field require_type "
+                          f"({stats['legacy_seconds']:.3f}s)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Wrote {args.output}.")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline {args.baseline}.")
+        return
+
+    if not os.path.exists(args.baseline):
+        if args.require_baseline:
+            print(f"Error: baseline {args.baseline} not found; record one with --save-baseline.")
+            sys.exit(1)
+        print(f"Warning: baseline {args.baseline} not found, results were not compared. "
+              "Record one with --save-baseline.")
+    else:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("params") != results["params"]:
+            print("Warning: baseline was recorded with different parameters.")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import json
+import random
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import argparse
+
+FRAME_TYPES = [
+    "normal", "effect", "fusion", "ritual", "synchro", "xyz", "link",
+    "effect_pendulum", "normal_pendulum", "spell", "trap"
+]
+ATTRIBUTES = ["LIGHT", "DARK", "EARTH", "FIRE", "WATER", "WIND", "DIVINE"]
+SPELL_RACES = ["Normal", "Continuous", "Field", "Equip", "Quick-Play", "Ritual"]
+TRAP_RACES = ["Normal", "Continuous", "Counter"]
+LINK_MARKERS = ["Top", "Bottom", "Left", "Right", "Top-Left", "Top-Right", "Bottom-Left", "Bottom-Right"]
+
+def synthetic_card_ids(count, seed=0):
+    rng = random.Random(seed)
+    return sorted(rng.sample(range(10000000, 99999999), count))
+
+def make_json1_card(rng, card_id, alt_id=None):
+    frame_type = rng.choice(FRAME_TYPES)
+    card = {
+        "id": card_id,
+        "name": f"Synthetic Card {card_id}",
+        "type": "Effect Monster",
+        "frameType": frame_type,
+        "desc": "Synthetic description " * rng.randint(5, 20),
+        "card_images": [{"id": card_id, "image_url": f"https://example.invalid/{card_id}.jpg"}]
+    }
+    if alt_id is not None:
+        card["card_images"].append({"id": alt_id, "image_url": f"https://example.invalid/{alt_id}.jpg"})
+
+    if frame_type == "spell":
+        card["race"] = rng.choice(SPELL_RACES)
+    elif frame_type == "trap":
+        card["race"] = rng.choice(TRAP_RACES)
+    else:
+        card["attribute"] = rng.choice(ATTRIBUTES)
+        card["atk"] = rng.randrange(0, 5001, 50)
+        card["typeline"] = ["Warrior", "Effect"]
+        if frame_type == "link":
+            markers = rng.sample(LINK_MARKERS, rng.randint(1, 4))
+            card["linkval"] = len(markers)
+            card["linkmarkers"] = markers
+        else:
+            card["def"] = rng.randrange(0, 5001, 50)
+            card["level"] = rng.randint(1, 12)
+        if "pendulum" in frame_type:
+            card["scale"] = rng.randint(0, 13)
+    return card
+
+def make_json2_card(rng, cid, card_id, frame_type):
+    text = {
+        "types": "[怪兽|效果|战士] 4 光/1800/1000",
+        "desc": "合成效果文本。\r\n①：效果一。\r\n②：效果二。" * rng.randint(1, 4)
+    }
+    if "pendulum" in frame_type:
+        text["pdesc"] = "①：灵摆效果。"
+    return {
+        "cid": cid,
+        "id": card_id,
+        "cn_name": f"合成卡{card_id}",
+        "sc_name": f"合成卡{card_id}",
+        "md_name": f"合成卡{card_id}",
+        "nwbbs_n": f"合成卡{card_id}",
+        "cnocg_n": f"合成卡{card_id}",
+        "jp_ruby": "ごうせい",
+        "jp_name": "合成カード",
+        "en_name": f"Synthetic Card {card_id}",
+        "text": text,
+        "data": {"ot": 11, "setcode": 0, "type": 33, "atk": 1800, "def": 1000, "level": 4, "race": 1, "attribute": 16},
+        "weight": 100,
+        "faqs": [],
+        "artid": 0
+    }
+
+def generate_json_sources(out_dir, count, seed=0, alt_ratio=0.05, missing_ratio=0.01):
+    """
+    Writes cardinfo.php-shaped json1.json and ygocdb-shaped json2.json with count cards.
+    Returns (json1_path, json2_path).
+    """
+    rng = random.Random(seed)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    json1_path = os.path.join(out_dir, "json1.json")
+    json2_path = os.path.join(out_dir, "json2.json")
+
+    card_ids = synthetic_card_ids(count, seed)
+    with open(json1_path, 'w', encoding='utf-8') as f1, open(json2_path, 'w', encoding='utf-8') as f2:
+        f1.write('{"data":[')
+        f2.write('{')
+        json2_written = 0
+        for index, card_id in enumerate(card_ids):
+            alt_id = card_id + 1 if rng.random() < alt_ratio else None
+            card = make_json1_card(rng, card_id, alt_id)
+            if index:
+                f1.write(",")
+            f1.write(json.dumps(card, ensure_ascii=False))
+
+            if rng.random() < missing_ratio:
+                continue
+            if json2_written:
+                f2.write(",")
+            json2_written += 1
+            entry = make_json2_card(rng, index + 1, card_id, card["frameType"])
+            f2.write(f'"{index + 1}":' + json.dumps(entry, ensure_ascii=False))
+        f1.write('],"meta":{"total_rows":' + str(count) + '}}')
+        f2.write('}')
+    return json1_path, json2_path
+
+TYPELINE_TERMS = {
+    "Warrior": "战士", "Spellcaster": "魔法师", "Dragon": "龙", "Machine": "机械",
+    "Fiend": "恶魔", "Fairy": "天使", "Beast": "兽", "Zombie": "不死"
+}
+
+def write_checksum(path, algorithm):
+    # Writes <path>.<algorithm> holding "<hex digest>  <basename>", as sha256sum/md5sum do.
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    checksum_path = f"{path}.{algorithm}"
+    with open(checksum_path, 'w', encoding='utf-8') as f:
+        f.write(f"{digest.hexdigest()}  {os.path.basename(path)}\n")
+    return checksum_path
+
+def generate_resources(res_dir, card_ids, seed=0, token_count=100, banned_ratio=0.01):
+    """
+    Writes token.json, typeline.conf and limited/{ocg,tcg,md}.json in the res/ layout.
+    """
+    rng = random.Random(seed)
+    limited_dir = os.path.join(res_dir, "limited")
+    os.makedirs(limited_dir, exist_ok=True)
+
+    tokens = {}
+    for index in range(token_count):
+        token_id = 100 + index
+        tokens[str(token_id)] = {
+            "id": token_id, "uniqueId": token_id, "cardImage": token_id,
+            "name": f"衍生物{token_id}", "description": "", "cardType": "monster",
+            "attribute": "light", "frameType": "token", "atk": 0, "def": 0, "level": 1
+        }
+    with open(os.path.join(res_dir, "token.json"), 'w', encoding='utf-8') as f:
+        json.dump(tokens, f, ensure_ascii=False)
+
+    with open(os.path.join(res_dir, "typeline.conf"), 'w', encoding='utf-8') as f:
+        for term, translation in TYPELINE_TERMS.items():
+            f.write(f"{term}={translation}\n")
+
+    listed = rng.sample(card_ids, min(len(card_ids), max(1, int(len(card_ids) * banned_ratio))))
+    for format_name in ["ocg", "tcg", "md"]:
+        statuses = {"forbidden": [], "limited": [], "semi-limited": []}
+        for card_id in listed:
+            if rng.random() < 0.7:
+                statuses[rng.choice(list(statuses))].append(card_id)
+        with open(os.path.join(limited_dir, f"{format_name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(statuses, f)
+
+def generate_upstream(out_dir, count, seed=0, alt_ratio=0.05, missing_ratio=0.01):
+    # Builds offline upstream sources for count cards: tmp/ and res/ as generate_cards_json reads them plus the
+    # published files under www/. Returns {URL constant name: file under www/} for StandInServer.
+    tmp_dir = os.path.join(out_dir, "tmp")
+    res_dir = os.path.join(out_dir, "res")
+    www_dir = os.path.join(out_dir, "www")
+    os.makedirs(www_dir, exist_ok=True)
+
+    json1_path, json2_path = generate_json_sources(tmp_dir, count, seed, alt_ratio, missing_ratio)
+    generate_resources(res_dir, synthetic_card_ids(count, seed), seed)
+
+    cardinfo_path = os.path.join(www_dir, "cardinfo.php")
+    shutil.copyfile(json1_path, cardinfo_path)
+
+    zip_path = os.path.join(www_dir, "cards.zip")
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.write(json2_path, "cards.json")
+    # ygocdb publishes the MD5 of the extracted cards.json.
+    md5_path = write_checksum(json2_path, "md5")
+    shutil.move(md5_path, zip_path + ".md5")
+
+    limited_path = os.path.join(www_dir, "forbidden_and_limited_list.tar.xz")
+    with tarfile.open(limited_path, "w:xz") as tar:
+        for format_name in ["ocg", "tcg", "md"]:
+            tar.add(os.path.join(res_dir, "limited", f"{format_name}.json"), f"{format_name}.json")
+
+    files = {
+        "JSON1_URL": cardinfo_path,
+        "JSON2_ZIP_URL": zip_path,
+        "JSON2_MD5_URL": zip_path + ".md5",
+        "LIMITED_URL": limited_path,
+        "LIMITED_SHA256_URL": write_checksum(limited_path, "sha256"),
+    }
+    for name, constant in [("token.json", "TOKEN"), ("typeline.conf", "TYPELINE")]:
+        path = os.path.join(www_dir, name)
+        shutil.copyfile(os.path.join(res_dir, name), path)
+        files[f"{constant}_URL"] = path
+        files[f"{constant}_SHA256_URL"] = write_checksum(path, "sha256")
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic upstream sources.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--cards", type=int, default=13000, help="number of json1 cards (13000 today, up to 500000)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name, path in sorted(generate_upstream(args.out_dir, args.cards, args.seed).items()):
+        print(f"{name}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
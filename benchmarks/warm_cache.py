@@ -0,0 +1,60 @@
+import os
+import sys
+import argparse
+import tempfile
+import contextlib
+import requests
+from .standin_server import StandInServer
+from src.cache import cached_download
+
+# Check that a warm cache costs no body bytes: the first cached_download of a source
+# served by the stand-in server downloads it, the second revalidates with If-None-Match,
+# gets a 304 and reads nothing. Exits non-zero if either does not hold.
+
+def check_warm_run(size):
+    with tempfile.TemporaryDirectory() as work_dir:
+        source_path = os.path.join(work_dir, "cards.zip")
+        with open(source_path, 'wb') as f:
+            f.write(os.urandom(size))
+        cache_dir = os.path.join(work_dir, "cache")
+
+        with StandInServer(latency=0.0, files={"/cards.zip": source_path}) as server:
+            url = server.base_url + "/cards.zip"
+            session = requests.Session()
+            responses = []
+            session.hooks["response"].append(lambda response, *args, **kwargs: responses.append(response))
+
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                cold_path, cold_entry, cold_modified = cached_download(url, cache_dir, session)
+                responses.clear()
+                warm_path, warm_entry, warm_modified = cached_download(url, cache_dir, session)
+
+            cold, warm = server.request_log
+            problems = []
+            if not cold_modified or cold[2] != 200 or cold[3] != size:
+                problems.append(f"cold run: expected a full 200 of {size} bytes, got {cold[2]} with {cold[3]} bytes")
+            if warm_modified or warm[2] != 304:
+                problems.append(f"warm run: expected a 304 hit, got {warm[2]}")
+            if warm[3] != 0:
+                problems.append(f"warm run: server sent {warm[3]} body bytes")
+            received = sum(response.raw.tell() for response in responses)
+            if received != 0:
+                problems.append(f"warm run: client read {received} body bytes")
+            if warm_path != cold_path or warm_entry != cold_entry:
+                problems.append("warm run: cache entry changed")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a second cached_download of an unchanged source sends no body.")
+    parser.add_argument("--size", type=int, default=1 << 20, help="size of the served source in bytes")
+    args = parser.parse_args()
+
+    problems = check_warm_run(args.size)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"OK: warm run was a 304 with 0 body bytes (cold run {args.size} bytes).")
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,267 @@
 import os
-import shutil
-from src.resources import download_resources
-from src.data_manager import process_json2, process_json1, format_json_files
-from src.card_processor import generate_cards_json
-from src.image_manager import download_images
+import sys
+import argparse
+from src.card_outputs import OUTPUT_FORMATS, OutputFormatError, check_formats
+from src.instrumentation import configure, stage, write_report
+
+# Without a command main.py runs the whole release build (fetch, build, images) as before.
+# The commands run one stage each and import only what that stage needs; see src/stages.py.
 
 def main():
-    res_dir = "res"
-    download_resources(res_dir)
-    tmp_dir = "tmp"
-    if not os.path.exists(tmp_dir):
-        os.makedirs(tmp_dir)
-
-    process_json2(tmp_dir)
-    process_json1(tmp_dir)
-    format_json_files(tmp_dir)
-    generate_cards_json(tmp_dir, "cards.json", res_dir)
-
-    # Cleanup
-    if os.path.exists(tmp_dir):
-        shutil.rmtree(tmp_dir)
-        print(f"Removed {tmp_dir}")
-
-    if os.path.exists(res_dir):
-        shutil.rmtree(res_dir)
-        print(f"Removed {res_dir}")
-
-    download_images("cards.json", "fig")
+    report_options = argparse.ArgumentParser(add_help=False)
+    report_options.add_argument(
+        "--report", metavar="PATH",
+        help="write a JSON run report (per-stage time, memory, requests, bytes) to PATH"
+    )
+    report_options.add_argument(
+        "--profile", nargs="+", metavar="STAGE", default=[],
+        help="run these stages under cProfile, e.g. build images.fetch (stats go next to the report)"
+    )
+    report_options.add_argument(
+        "--trace-memory", nargs="+", metavar="STAGE", default=[],
+        help="run these stages under tracemalloc and put their top allocations in the report"
+    )
+
+    build_options = argparse.ArgumentParser(add_help=False)
+    build_options.add_argument(
+        "--incremental", action="store_true",
+        help="rebuild only cards whose inputs changed since the last run and write cards.delta.json"
+    )
+    build_options.add_argument(
+        "--sqlite", metavar="PATH",
+        help="also export the cards to an indexed SQLite database at PATH"
+    )
+    build_options.add_argument(
+        "--formats", nargs="+", metavar="FORMAT", default=[], choices=OUTPUT_FORMATS,
+        help="also write cards.json as these formats in the same pass, each with a .sha256 "
+             "(e.g. min.json min.json.gz min.json.zst)"
+    )
+    build_options.add_argument(
+        "--workers", type=int, metavar="N",
+        help="transform json1 cards on N processes (not combined with --incremental)"
+    )
+
+    variants_option = argparse.ArgumentParser(add_help=False)
+    variants_option.add_argument(
+        "--variants", nargs="+", metavar="FORMAT[@WIDTH]",
+        help="after downloading, transcode fig/ into these variants under fig-variants/ (e.g. png webp@200)"
+    )
+
+    image_options = argparse.ArgumentParser(add_help=False)
+    image_options.add_argument(
+        "--image-source", action="append", metavar="TEMPLATE",
+        help="image URL (or local path) template with {image_id}; the first replaces the ygoprodeck "
+             "image host, repeat it to add mirrors tried after it"
+    )
+    image_options.add_argument(
+        "--hedge-percentile", type=float, metavar="P",
+        help="with several sources, also ask the next one when a request is slower than the P-th "
+             "percentile of recent requests (default 95, 0 only falls back on errors)"
+    )
+
+    parser = argparse.ArgumentParser(
+        description="Build cards.json and download card images.",
+        parents=[build_options, variants_option, image_options, report_options]
+    )
+    parser.add_argument(
+        "--keep-intermediates", metavar="DIR",
+        help="also write the fetched sources to DIR (same layout as res/ and tmp/) for debugging"
+    )
+    commands = parser.add_subparsers(
+        dest="command", metavar="COMMAND", help="run a single stage instead of the whole build"
+    )
+    commands.add_parser(
+        "fetch", parents=[report_options],
+        help="refresh the upstream sources into tmp/ and res/ through the download cache"
+    )
+    build = commands.add_parser(
+        "build", parents=[build_options, report_options],
+        help="build cards.json from tmp/ and res/, fetching them only if missing or modified"
+    )
+    build.add_argument(
+        "--offline", action="store_true",
+        help="fail instead of fetching when tmp/ and res/ are not from a complete fetch"
+    )
+    build.add_argument(
+        "--streaming", action="store_true",
+        help="build with bounded memory (not combined with --incremental or --workers)"
+    )
+    images = commands.add_parser(
+        "images", parents=[variants_option, image_options, report_options],
+        help="sync fig/ with the cards in cards.json"
+    )
+    images.add_argument(
+        "--verify", action="store_true",
+        help="also re-hash every image against the manifest and re-download damaged ones"
+    )
+    images.add_argument(
+        "--shard", type=shard_argument, metavar="I/N",
+        help="download only shard I of N (0-based) into shards/fig-I-of-N/ for a later merge"
+    )
+    merge = commands.add_parser(
+        "merge", parents=[image_options, report_options],
+        help="merge shard directories from images --shard into fig/ and report what is missing"
+    )
+    merge.add_argument("shard_dirs", nargs="+", metavar="SHARD_DIR")
+    merge.add_argument(
+        "--retry", action="store_true",
+        help="download the cards no shard delivered before writing the failure report"
+    )
+    pack = commands.add_parser(
+        "pack", parents=[report_options],
+        help="pack fig/ into reproducible tar.xz release shards"
+    )
+    pack.add_argument("output_dir", nargs="?", default="release_assets")
+    pack.add_argument("--shard-size", type=int, metavar="N", help="images per shard")
+    pack.add_argument("--workers", type=int, metavar="N", help="compress N shards in parallel")
+    watch = commands.add_parser(
+        "watch", parents=[build_options, variants_option, image_options, report_options],
+        help="poll the upstream sources and run the whole build only when one of them changed"
+    )
+    watch.add_argument(
+        "--interval", type=float, metavar="SECONDS", default=900,
+        help="seconds between polls (default 900)"
+    )
+    watch.add_argument(
+        "--max-interval", type=float, metavar="SECONDS", default=6 * 3600,
+        help="longest delay after repeated failures (default 21600)"
+    )
+    watch.add_argument(
+        "--jitter", type=float, metavar="FRACTION", default=0.2,
+        help="spread every delay randomly by this fraction (default 0.2)"
+    )
+    watch.add_argument(
+        "--once", action="store_true",
+        help="poll once, build if needed and exit (for an external scheduler)"
+    )
+    verify = commands.add_parser(
+        "verify", parents=[report_options],
+        help="check cards.json and its variants against their .sha256 files, the offset index and fig/"
+    )
+    verify.add_argument("--skip-images", action="store_true", help="do not check fig/")
+    args = parser.parse_args()
+    if getattr(args, "shard", None) and args.variants:
+        parser.error("--variants needs the merged fig/, it cannot be combined with --shard")
+    if getattr(args, "streaming", False) and (args.incremental or (args.workers and args.workers > 1)):
+        parser.error("--streaming cannot be combined with --incremental or --workers")
+    if getattr(args, "incremental", False) and args.workers and args.workers > 1:
+        parser.error("--incremental rebuilds serially, it cannot be combined with --workers")
+    try:
+        check_formats(getattr(args, "formats", []))
+    except OutputFormatError as e:
+        parser.error(str(e))
+    configure(args.profile, args.trace_memory, os.path.dirname(args.report or "") or ".", bool(args.report))
+
+    handlers = {
+        None: run, "fetch": run_fetch, "build": run_build, "images": run_images, "pack": run_pack,
+        "merge": run_merge, "watch": run_watch, "verify": run_verify
+    }
+    try:
+        ok = handlers[args.command](args)
+    finally:
+        if args.report:
+            write_report(args.report)
+    if ok is False:
+        sys.exit(1)
+
+def run(args):
+    from src.pipeline import run_pipeline
+    from src.scheduler import TaskGraph
+    from src.image_manager import ImagePrefetcher, download_images
+
+    # Upstream downloads persist here between runs and are revalidated with ETag/Last-Modified.
+    cache_dir = ".cache"
+    # Images are prefetched while cards.json is built; the prefetch and the final sync never overlap,
+    # so the image host still sees at most 20 req/s.
+    prefetcher = ImagePrefetcher("fig", **image_options(args))
+
+    def build_cards():
+        try:
+            with stage("pipeline"):
+                return run_pipeline(
+                    "cards.json", cache_dir, args.keep_intermediates, args.incremental, args.sqlite, args.workers,
+                    on_card=lambda key, card: prefetcher.submit(key, card.get("cardImage", key)),
+                    formats=args.formats
+                )
+        finally:
+            prefetcher.close()
+
+    def sync_images(cards_data, _):
+        if cards_data is not None:
+            download_images("cards.json", "fig", cards=cards_data, **image_options(args))
+        return cards_data
+
+    graph = TaskGraph()
+    graph.add("cards", build_cards)
+    graph.add("prefetch", prefetcher.run)
+    graph.add("images", sync_images, "cards", "prefetch")
+    if graph.run()["images"] is None:
+        return False
+
+    if args.variants:
+        from src.image_postprocess import postprocess_images
+        postprocess_images("fig", "fig-variants", args.variants)
+    return True
+
+def image_options(args):
+    # --image-source/--hedge-percentile as keyword arguments for the image functions; unset ones keep their defaults.
+    options = {}
+    if args.image_source:
+        options["url_template"] = args.image_source
+    if args.hedge_percentile is not None:
+        options["hedge_percentile"] = args.hedge_percentile
+    return options
+
+def run_fetch(args):
+    from src.stages import fetch_sources
+    return fetch_sources()
+
+def run_build(args):
+    from src.stages import build_from_sources
+    return build_from_sources(
+        "cards.json", offline=args.offline, streaming=args.streaming, incremental=args.incremental,
+        sqlite_path=args.sqlite, workers=args.workers, formats=args.formats
+    )
+
+def shard_argument(text):
+    from src.shards import parse_shard
+    try:
+        return parse_shard(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N with 0 <= I < N, got '{text}'")
+
+def run_images(args):
+    if args.shard:
+        from src.shards import download_shard
+        report = download_shard("cards.json", *args.shard, **image_options(args))
+        return report is not None and not report["failed"]
+    from src.image_manager import download_images
+    download_images("cards.json", "fig", verify=args.verify, **image_options(args))
+    if args.variants:
+        from src.image_postprocess import postprocess_images
+        postprocess_images("fig", "fig-variants", args.variants)
+
+def run_pack(args):
+    from src.packer import SHARD_SIZE, pack_images
+    pack_images("fig", args.output_dir, args.shard_size or SHARD_SIZE, args.workers)
+
+def run_merge(args):
+    from src.shards import merge_shards
+    report = merge_shards(args.shard_dirs, "fig", "cards.json", args.retry, **image_options(args))
+    return report is not None and not report["failed"]
+
+def run_watch(args):
+    from src.watch import watch
+    try:
+        return watch(
+            lambda: run(args), ".cache", args.interval, args.max_interval, args.jitter, args.once
+        )
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+def run_verify(args):
+    from src.stages import verify_outputs
+    return verify_outputs("cards.json", None if args.skip_images else "fig")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,112 @@
+import os
+import shutil
+import hashlib
+import threading
+import requests
+from .utils import download_file, load_json_or_default, write_json_atomic
+
+INDEX_FILENAME = "index.json"
+# Sources are fetched concurrently, so updates of the shared index are serialized.
+INDEX_LOCK = threading.Lock()
+
+def load_cache_index(cache_dir):
+    return load_json_or_default(os.path.join(cache_dir, INDEX_FILENAME), {}, "cache index")
+
+def save_cache_index(cache_dir, index):
+    write_json_atomic(os.path.join(cache_dir, INDEX_FILENAME), index, indent=4)
+
+def cache_path_for(cache_dir, url):
+    # Prefix with a short URL hash so sources sharing a basename do not collide.
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]
+    basename = url.rstrip('/').rsplit('/', 1)[-1] or "index"
+    return os.path.join(cache_dir, f"{url_hash}-{basename}")
+
+def is_entry_valid(entry, path):
+    if not entry or not os.path.exists(path):
+        return False
+    return os.path.getsize(path) == entry.get("size")
+
+def cached_download(url, cache_dir, session=None):
+    """
+    Fetches url into cache_dir, revalidating with If-None-Match/If-Modified-Since.
+    Returns (path, entry, modified); modified is False when the server answered 304.
+    """
+    # exist_ok: several sources may be fetched into a fresh cache at once.
+    os.makedirs(cache_dir, exist_ok=True)
+
+    index = load_cache_index(cache_dir)
+    entry = index.get(url)
+    path = cache_path_for(cache_dir, url)
+
+    headers = {}
+    if is_entry_valid(entry, path):
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    else:
+        entry = None
+
+    print(f"Fetching {url} (cache: {cache_dir})...")
+    result = download_file(url, path, session, headers)
+    if result["status"] == 304:
+        if entry is None:
+            raise requests.HTTPError(f"Unexpected 304 for unconditional request to {url}")
+        print("Not modified, using cached copy.")
+        return path, entry, False
+
+    entry = {
+        "etag": result["etag"],
+        "last_modified": result["last_modified"],
+        "sha256": result["sha256"],
+        "md5": result["md5"],
+        "size": result["size"],
+        "derived": {}
+    }
+
+    # A changed body invalidates anything previously derived from it.
+    derived_dir = path + ".d"
+    if os.path.exists(derived_dir):
+        shutil.rmtree(derived_dir)
+
+    with INDEX_LOCK:
+        index = load_cache_index(cache_dir)
+        index[url] = entry
+        save_cache_index(cache_dir, index)
+    return path, entry, True
+
+def link_cached(cached_path, target_path):
+    # Hardlink a cached body into place, copying where links are unsupported; nothing to do if it is already there.
+    # Safe because cached bodies are only ever replaced via .part + os.replace, never rewritten in place.
+    if os.path.exists(target_path) and os.path.samefile(cached_path, target_path):
+        return False
+    tmp_path = target_path + ".part"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(cached_path, tmp_path)
+    except OSError:
+        shutil.copyfile(cached_path, tmp_path)
+    os.replace(tmp_path, target_path)
+    return True
+
+def derived_dir_for(cache_dir, url):
+    derived_dir = cache_path_for(cache_dir, url) + ".d"
+    if not os.path.exists(derived_dir):
+        os.makedirs(derived_dir)
+    return derived_dir
+
+def record_derived(cache_dir, url, key, value):
+    # Remember work done on a cached body (verification, extraction) so a 304 can skip it.
+    with INDEX_LOCK:
+        index = load_cache_index(cache_dir)
+        entry = index.get(url)
+        if entry is None:
+            return
+        entry.setdefault("derived", {})[key] = value
+        save_cache_index(cache_dir, index)
+
+def get_derived(entry, key):
+    if not entry:
+        return None
+    return entry.get("derived", {}).get(key)
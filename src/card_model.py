@@ -0,0 +1,96 @@
+import keyword
+import operator
+import collections
+from collections.abc import Mapping
+
+# Compact in-memory cards: Card is a read-only mapping over __slots__ with the cards.json field names;
+# variants share interned strings and text, and as_dict() gives back the exact cards.json object.
+
+FIELDS = [
+    "id", "uniqueId", "cardImage", "name", "description", "cardType", "attribute", "frameType",
+    "race", "atk", "def", "level", "linkVal", "linkMarkers", "scale", "pendulumDescription",
+    "typeline", "limit"
+]
+# "def" is a keyword, so its slot (and Card keyword argument) is def_.
+SLOTS = {field: field + "_" if keyword.iskeyword(field) else field for field in FIELDS}
+FIELD_NAMES = {slot: field for field, slot in SLOTS.items()}
+MISSING = object()
+SHAPES = {}
+
+# json2 text of one card, shared by every variant built from it.
+CardText = collections.namedtuple("CardText", ["name", "desc", "pdesc", "types"])
+
+def card_shape(slots):
+    """
+    Returns (fields, getter) for one combination of set slots: the present cards.json
+    fields in a fixed order and a function returning their values as a tuple.
+    Cards with the same fields share one shape.
+    """
+    shape = SHAPES.get(slots)
+    if shape is None:
+        ordered = [slot for slot in SLOTS.values() if slot in slots]
+        fields = tuple(FIELD_NAMES[slot] for slot in ordered)
+        if len(ordered) > 1:
+            getter = operator.attrgetter(*ordered)
+        else:
+            getter = lambda card: tuple(getattr(card, slot) for slot in ordered)
+        shape = SHAPES[slots] = (fields, getter)
+    return shape
+
+def card_from_items(items):
+    return Card(**{SLOTS[field]: value for field, value in items})
+
+class Card(Mapping):
+    """
+    Card(id=..., uniqueId=..., def_=..., ...); fields that are not given are absent,
+    exactly like keys missing from the cards.json object. Values are shared between
+    cards, so treat them as read-only.
+    """
+
+    __slots__ = tuple(SLOTS.values()) + ("shape",)
+
+    def __init__(self, **fields):
+        for slot, value in fields.items():
+            setattr(self, slot, value)
+        self.shape = card_shape(tuple(fields))
+
+    def __getitem__(self, field):
+        slot = SLOTS.get(field)
+        value = MISSING if slot is None else getattr(self, slot, MISSING)
+        if value is MISSING:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self):
+        return iter(self.shape[0])
+
+    def __len__(self):
+        return len(self.shape[0])
+
+    def __repr__(self):
+        return f"Card({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # The shape holds a function, so pickle the fields and rebuild it on load.
+        return (card_from_items, (tuple(self.items()),))
+
+    def to_dict(self):
+        fields, getter = self.shape
+        return dict(zip(fields, getter(self)))
+
+def as_dict(card_obj):
+    # The plain cards.json object for a Card or an already plain dict (tokens, previous output).
+    return card_obj.to_dict() if isinstance(card_obj, Card) else card_obj
+
+LIMIT_DICTS = {}
+
+def shared_limit(statuses):
+    # statuses is a tuple of (format, status) pairs; equal tuples share one limit dict.
+    limit = LIMIT_DICTS.get(statuses)
+    if limit is None:
+        limit = LIMIT_DICTS[statuses] = dict(statuses)
+    return limit
+
+def image_jobs(cards):
+    # [(card_id, image_id)] for every card of an in-memory key -> card mapping, in key order.
+    return [(key, cards[key].get("cardImage", key)) for key in sorted(cards)]
@@ -0,0 +1,189 @@
+import os
+import gzip
+import hashlib
+
+# Every published form of cards.json (pretty, minified, gzip/zstd of either) is written, hashed and given
+# a .sha256 sidecar in the one pass that writes cards.json. Formats are named by the suffix replacing ".json".
+
+OUTPUT_FORMATS = ["json", "json.gz", "json.zst", "min.json", "min.json.gz", "min.json.zst"]
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 19
+
+class OutputFormatError(Exception):
+    pass
+
+def output_path_for(output_path, output_format):
+    base, _ = os.path.splitext(output_path)
+    return f"{base}.{output_format}"
+
+def sha256_sidecar_path(path):
+    return path + ".sha256"
+
+def import_zstd():
+    # compression.zstd is in the standard library from Python 3.14; before that the zstandard package is used.
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError as e:
+        raise OutputFormatError(
+            ".zst outputs need Python 3.14 or zstandard; install the 'compression' extra (uv sync --extra compression)"
+        ) from e
+    return zstandard
+
+def open_zstd_writer(fileobj):
+    zstd = import_zstd()
+    if zstd.__name__ == "compression.zstd":
+        return zstd.ZstdFile(fileobj, "w", level=ZSTD_LEVEL)
+    return zstd.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(fileobj, closefd=False)
+
+def wants_minified(formats):
+    # Whether any of formats needs the minified entries (see CardOutputs.entries).
+    return any(output_format.startswith("min.") for output_format in formats)
+
+def check_formats(formats):
+    # Raises OutputFormatError for unknown formats or a missing zstd module, before any work is done.
+    for output_format in formats:
+        if output_format not in OUTPUT_FORMATS:
+            raise OutputFormatError(
+                f"unknown output format '{output_format}' (expected one of {', '.join(OUTPUT_FORMATS)})"
+            )
+        if output_format.endswith(".zst"):
+            import_zstd()
+
+class DigestFile:
+    """
+    Binary file written to <path>.part and hashed on the way; commit() moves it into
+    place and writes its .sha256 sidecar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path + ".part", 'wb')
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.path + ".part", self.path)
+        digest = self.hash.hexdigest()
+        with open(sha256_sidecar_path(self.path), 'w', encoding='utf-8') as f:
+            f.write(f"{digest}  {os.path.basename(self.path)}\n")
+        return {"path": self.path, "sha256": digest, "size": self.size}
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path + ".part"):
+            os.remove(self.path + ".part")
+
+class OutputFile:
+    # One output format: the layout's bytes, compressed if the format asks for it.
+
+    def __init__(self, path, output_format):
+        self.target = DigestFile(path)
+        self.stream = self.target
+        try:
+            if output_format.endswith(".gz"):
+                # Fixed mtime and no file name, so identical cards give identical bytes.
+                self.stream = gzip.GzipFile(filename="", mode='wb', fileobj=self.target, mtime=0,
+                                            compresslevel=GZIP_LEVEL)
+            elif output_format.endswith(".zst"):
+                self.stream = open_zstd_writer(self.target)
+        except Exception:
+            self.target.discard()
+            raise
+
+    def write(self, data):
+        self.stream.write(data)
+
+    def commit(self):
+        if self.stream is not self.target:
+            self.stream.close()
+        return self.target.commit()
+
+    def discard(self):
+        if self.stream is not self.target:
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+        self.target.discard()
+
+class CardOutputs:
+    # Write target for write_indexed_entries: pretty bytes go to every pretty format, entries() routes the
+    # minified entries to the min formats. close() returns {format: {"path", "sha256", "size"}}.
+
+    def __init__(self, output_path, formats=()):
+        formats = ["json"] + [f for f in formats if f != "json"]
+        check_formats(formats)
+        self.files = {}
+        try:
+            for output_format in formats:
+                self.files[output_format] = OutputFile(output_path_for(output_path, output_format), output_format)
+        except Exception:
+            self.discard()
+            raise
+        self.pretty = [f for name, f in self.files.items() if not name.startswith("min.")]
+        self.minified = [f for name, f in self.files.items() if name.startswith("min.")]
+        self.position = 0
+        self.min_count = 0
+        self.results = None
+
+    def write(self, data):
+        for f in self.pretty:
+            f.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def entries(self, entries):
+        """
+        entries yields (key, entry bytes from format_card_entry, cardImage, minified entry
+        bytes from format_min_entry); the minified bytes are only needed, and may be None,
+        unless wants_minified(formats). Yields the first three, as write_indexed_entries takes them.
+        """
+        for key, data, card_image, min_data in entries:
+            if self.minified:
+                self.write_minified(min_data)
+            yield key, data, card_image
+
+    def write_minified(self, min_data):
+        chunk = (b"{" if self.min_count == 0 else b",") + min_data
+        for f in self.minified:
+            f.write(chunk)
+        self.min_count += 1
+
+    def close(self):
+        if self.results is None:
+            closing = b"}" if self.min_count else b"{}"
+            for f in self.minified:
+                f.write(closing)
+            self.results = {name: f.commit() for name, f in self.files.items()}
+        return self.results
+
+    def discard(self):
+        for f in self.files.values():
+            f.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
@@ -1,110 +1,46 @@
 import os
-import json
 import re
-from .resources import load_limited_list, load_typeline_conf
-
-class CardDataError(Exception):
-    pass
+import sys
+import json
+import itertools
+import collections
+from .resource_files import load_limited_list, load_typeline_conf
+from .json_stream import JsonStreamError, iter_array_field, iter_object_members
+from .card_store import save_offset_index, write_indexed_entries
+from .card_outputs import CardOutputs, wants_minified
+from .card_model import Card, CardText, as_dict, shared_limit
+from .instrumentation import add_written, note, stage
+from .card_schema import (
+    CardDataError, frame_validator, json1_context, type_name,
+    validate_json1_frame_type, validate_json1_identity, validate_json2_fields, validate_json2_text
+)
 
 def normalize_card_text(text):
     # Keep the line break before ①, but collapse it for ②+ style markers and bullets.
     normalized = text.replace('\r\n', '\n')
     return re.sub(r'\n(?=[②-⑳●])', '', normalized)
 
-def type_name(value):
-    if value is None:
-        return "null"
-    return type(value).__name__
-
 def is_str(value):
     return isinstance(value, str)
 
 def is_int(value):
     return isinstance(value, int) and not isinstance(value, bool)
 
-def require_type(obj, field_name, expected_type, context):
-    if field_name not in obj:
-        raise CardDataError(f"{context}: missing required field '{field_name}'")
-
-    value = obj[field_name]
-    if expected_type == "str" and not is_str(value):
-        raise CardDataError(
-            f"{context}: field '{field_name}' expected str, got {type_name(value)}"
-        )
-    if expected_type == "int" and not is_int(value):
-        raise CardDataError(
-            f"{context}: field '{field_name}' expected int, got {type_name(value)}"
-        )
-    if expected_type == "list" and not isinstance(value, list):
-        raise CardDataError(
-            f"{context}: field '{field_name}' expected list, got {type_name(value)}"
-        )
-
-    return value
-
-def require_optional_type(obj, field_name, expected_type, context):
-    if field_name not in obj:
-        return None
-    return require_type(obj, field_name, expected_type, context)
-
-def describe_card(card):
-    card_id = card.get("id") if isinstance(card, dict) else None
-    name = card.get("name") if isinstance(card, dict) else None
-    if is_str(name) and name:
-        return f"card id {card_id} ({name})"
-    return f"card id {card_id}"
-
 def validate_json2_card(card, source_key):
-    context = f"json2 entry {source_key}"
+    context = lambda: f"json2 entry {source_key}"
     if not isinstance(card, dict):
-        raise CardDataError(f"{context}: expected object, got {type_name(card)}")
-
-    card_id = require_type(card, "id", "int", context)
-    cn_name = require_type(card, "cn_name", "str", context)
-    desc = ""
-    pdesc = ""
-    types_str = ""
+        raise CardDataError(f"{context()}: expected object, got {type_name(card)}")
 
+    validate_json2_fields(card, context)
+    card_id = card["id"]
+    cn_name = card["cn_name"]
     text = card.get("text", {})
-    if text is None:
-        raise CardDataError(f"{context}: field 'text' expected object, got null")
-    if not isinstance(text, dict):
-        raise CardDataError(
-            f"{context}: field 'text' expected object, got {type_name(text)}"
-        )
-
-    if "desc" in text:
-        desc = require_type(text, "desc", "str", context)
-        desc = normalize_card_text(desc)
-    if "pdesc" in text:
-        pdesc = require_type(text, "pdesc", "str", context)
-        pdesc = normalize_card_text(pdesc)
-    if "types" in text:
-        types_str = require_type(text, "types", "str", context)
-
-    return card_id, {
-        "name": cn_name,
-        "desc": desc,
-        "pdesc": pdesc,
-        "types": types_str
-    }
+    validate_json2_text(text, context)
+    desc = normalize_card_text(text["desc"]) if "desc" in text else ""
+    pdesc = normalize_card_text(text["pdesc"]) if "pdesc" in text else ""
+    types_str = text.get("types", "")
 
-def validate_image_ids(card):
-    context = describe_card(card)
-    card_images = require_type(card, "card_images", "list", context)
-    if not card_images:
-        raise CardDataError(f"{context}: field 'card_images' must not be empty")
-
-    image_ids = []
-    for index, image in enumerate(card_images):
-        image_context = f"{context} card_images[{index}]"
-        if not isinstance(image, dict):
-            raise CardDataError(
-                f"{image_context}: expected object, got {type_name(image)}"
-            )
-        image_ids.append(require_type(image, "id", "int", image_context))
-
-    return image_ids
+    return card_id, CardText(cn_name, desc, pdesc, types_str)
 
 def find_card_info(main_id, image_ids, id_to_data):
     card_info = id_to_data.get(main_id)
@@ -118,50 +54,410 @@ def find_card_info(main_id, image_ids, id_to_data):
 
     return None, None
 
-def validate_card_fields(card, card_type, frame_type):
-    context = describe_card(card)
-    processed_frame_type = frame_type.replace('_', '-')
+def load_json2_lookup(json2_items):
+    # Build the id -> compact card info map from (source_key, card) pairs.
+    id_to_data = {}
+    invalid_json2_ids = {}
+    data_error_count = 0
+    for source_key, card in json2_items:
+        try:
+            card_id, card_info = validate_json2_card(card, source_key)
+            id_to_data[card_id] = card_info
+        except CardDataError as e:
+            data_error_count += 1
+            if isinstance(card, dict) and is_int(card.get("id")):
+                invalid_json2_ids[card["id"]] = str(e)
+            note("data_error", f"Data error: {e}. Skipping json2 entry.")
+    return id_to_data, invalid_json2_ids, data_error_count
+
+def build_card_variants(card, index, id_to_data, invalid_json2_ids, limited_lists, typeline_map):
+    """
+    Builds the cards.json entries for one json1 card, one per image id.
+    Returns a list of (key, Card), or None if the card has no json2 match.
+    Raises CardDataError on invalid data.
+    """
+    if not isinstance(card, dict):
+        raise CardDataError(
+            f"json1 data[{index}]: expected object, got {type_name(card)}"
+        )
+
+    # The context string is only built if something fails.
+    context = json1_context(card)
+    validate_json1_identity(card, context)
+    main_id = card["id"]
+    image_ids = [image["id"] for image in card["card_images"]]
+    card_info, _ = find_card_info(main_id, image_ids, id_to_data)
+
+    if not card_info:
+        invalid_match_ids = [card_id for card_id in [main_id] + image_ids if card_id in invalid_json2_ids]
+        if invalid_match_ids:
+            invalid_id = invalid_match_ids[0]
+            raise CardDataError(
+                f"{context()}: matching json2 card id {invalid_id} is invalid: {invalid_json2_ids[invalid_id]}"
+            )
+        return None
 
-    if card_type == "monster":
-        attribute = require_type(card, "attribute", "str", context).lower()
-    else:
-        attribute = card_type
+    # Determine cardType based on frameType; the compiled validator checks every
+    # field this frameType class reads below.
+    validate_json1_frame_type(card, context)
+    frame_type = card["frameType"]
+    (card_type, is_link, is_pendulum), validate_frame = frame_validator(frame_type)
+    validate_frame(card, context)
+    unique_id = min(image_ids)
+
+    # Everything but id and cardImage is the same for all variants, so it is built once
+    # and the variants share it.
+    fields = {
+        "uniqueId": unique_id,
+        "name": card_info.name,
+        "description": card_info.desc,
+        "cardType": card_type,
+        "attribute": sys.intern(card["attribute"].lower()) if card_type == "monster" else card_type,
+        "frameType": sys.intern(frame_type.replace('_', '-'))
+    }
 
-    race = None
-    if card_type in ["spell", "trap"]:
-        race = require_type(card, "race", "str", context).lower()
+    # Add limited status
+    limited_status = tuple(
+        (format_name, limited_lists[format_name][unique_id])
+        for format_name in ["ocg", "tcg", "md"] if unique_id in limited_lists[format_name]
+    )
+    if limited_status:
+        fields["limit"] = shared_limit(limited_status)
 
-    is_link = "link" in frame_type.lower()
-    is_pendulum = "pendulum" in frame_type.lower()
+    if card_type in ["spell", "trap"]:
+        fields["race"] = sys.intern(card["race"].lower())
 
     if card_type == "monster":
-        require_type(card, "atk", "int", context)
-        if is_link:
-            require_type(card, "linkval", "int", context)
-            linkmarkers = require_type(card, "linkmarkers", "list", context)
-            for index, marker in enumerate(linkmarkers):
-                if not is_str(marker):
-                    raise CardDataError(
-                        f"{context}: field 'linkmarkers[{index}]' expected str, got {type_name(marker)}"
-                    )
+        fields["atk"] = card["atk"]
+
+        # Construct typeline
+        typeline_parts = []
+        # 1. First element from json1 typeline, translated
+        typeline = card.get("typeline", [])
+        if typeline:
+            first_type = typeline[0]
+            translated_first = typeline_map.get(first_type, first_type)
+            typeline_parts.append(translated_first)
+
+        # 2. Elements from json2 types, reversed
+        types_str = card_info.types
+        if types_str:
+            # Extract content inside [...]
+            match = re.match(r"^\[(.*?)\]", types_str)
+            if match:
+                content = match.group(1)
+                parts = content.split("|")
+                if len(parts) > 1:
+                    # Skip first, reverse the rest
+                    remaining = parts[1:]
+                    remaining.reverse()
+                    typeline_parts.extend(remaining)
+
+        if typeline_parts:
+            fields["typeline"] = sys.intern(f"【{'/'.join(typeline_parts)}】")
+
+        if not is_link:
+            fields["def_"] = card["def"]
+            fields["level"] = card["level"]
         else:
-            require_type(card, "def", "int", context)
-            require_type(card, "level", "int", context)
-
-        require_optional_type(card, "scale", "int", context)
-        if is_pendulum and "scale" not in card:
-            raise CardDataError(f"{context}: missing required field 'scale'")
-
-    return {
-        "processed_frame_type": processed_frame_type,
-        "attribute": attribute,
-        "race": race,
-        "is_link": is_link,
-        "is_pendulum": is_pendulum
+            fields["linkVal"] = card["linkval"]
+            fields["linkMarkers"] = [sys.intern(m.lower()) for m in card["linkmarkers"]]
+
+        if is_pendulum:
+            fields["scale"] = card["scale"]
+            fields["pendulumDescription"] = card_info.pdesc
+
+    # Use string of int for key (JSON requirement), int for values.
+    return [(str(card_id), Card(id=card_id, cardImage=card_id, **fields)) for card_id in image_ids]
+
+def print_summary(json1_count, json2_count, count_before_token, token_count, count_after_token,
+                  not_found_count, data_error_count, skipped_count):
+    print("-" * 30)
+    print(f"Summary:")
+    print(f"json1.json: {json1_count} cards")
+    print(f"json2.json: {json2_count} cards")
+    print(f"cards.json (before tokens): {count_before_token} cards")
+    print(f"token.json: {token_count} cards")
+    print(f"cards.json (final): {count_after_token} cards")
+    if not_found_count > 0:
+        print(f"Info skipped: {not_found_count} cards (not found in json2)")
+    if data_error_count > 0:
+        print(f"Data errors: {data_error_count} entries skipped")
+    if skipped_count > 0:
+        print(f"Skipped total: {skipped_count} cards")
+    print("-" * 30)
+
+def card_outcome(build, card, index, id_to_data, invalid_json2_ids, limited_lists, typeline_map):
+    # Returns ("ok", variants), or ("error" / "not_found", log message).
+    try:
+        variants = build(card, index, id_to_data, invalid_json2_ids, limited_lists, typeline_map)
+    except CardDataError as e:
+        return "error", f"Data error: {e}. Skipping card."
+    if variants is None:
+        return "not_found", f"Info: Card with id {card['id']} not found in json2. Skipping."
+    return "ok", variants
+
+# State of a transform worker process, set once by init_transform_worker.
+WORKER_TABLES = ()
+WORKER_CARDS = None
+
+def init_transform_worker(tables, cards=None):
+    global WORKER_TABLES, WORKER_CARDS
+    WORKER_TABLES = tables
+    WORKER_CARDS = cards
+
+def transform_chunk(start_index, cards):
+    # cards is a list of json1 cards, or the end index into the inherited WORKER_CARDS.
+    if not isinstance(cards, list):
+        cards = WORKER_CARDS[start_index:cards]
+    return [
+        card_outcome(build_card_variants, card, start_index + offset, *WORKER_TABLES)
+        for offset, card in enumerate(cards)
+    ]
+
+def iter_outcomes_parallel(json1_cards, tables, workers, chunk_size=2000):
+    # Yields card_outcome results in input order from chunks run on a process pool, at most two per worker in
+    # flight; lookup tables (and a json1_cards list) reach the workers once, through the pool initializer.
+    # Imported here: only parallel builds need them.
+    import multiprocessing
+    import concurrent.futures
+
+    context = None
+    shared_cards = None
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        if isinstance(json1_cards, list):
+            shared_cards = json1_cards
+
+    cards = iter(json1_cards)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=init_transform_worker, initargs=(tables, shared_cards)
+    ) as executor:
+        pending = collections.deque()
+        next_index = 0
+        while True:
+            while len(pending) < workers * 2:
+                if shared_cards is not None:
+                    chunk_end = min(next_index + chunk_size, len(shared_cards))
+                    if chunk_end == next_index:
+                        break
+                    pending.append(executor.submit(transform_chunk, next_index, chunk_end))
+                    next_index = chunk_end
+                    continue
+                chunk = list(itertools.islice(cards, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(transform_chunk, next_index, chunk))
+                next_index += len(chunk)
+            if not pending:
+                break
+            yield from pending.popleft().result()
+
+def build_cards_data(json1_cards, json2_lookup, limited_lists, typeline_map, token_data=None, token_source="token.json",
+                     card_cache=None, workers=None, on_card=None):
+    # Builds (cards_data, summary) from in-memory inputs; json2_lookup is load_json2_lookup's tuple. card_cache
+    # or workers > 1 (same output, in input order) replace the serial build, and on_card(key, card) sees each card.
+    if workers and workers > 1 and card_cache is not None:
+        raise ValueError("workers cannot be combined with card_cache: incremental builds run serially")
+    id_to_data, invalid_json2_ids, data_error_count = json2_lookup
+    tables = (id_to_data, invalid_json2_ids, limited_lists, typeline_map)
+    if workers and workers > 1:
+        outcomes = iter_outcomes_parallel(json1_cards, tables, workers)
+    else:
+        build = card_cache.build if card_cache is not None else build_card_variants
+        outcomes = (card_outcome(build, card, index, *tables) for index, card in enumerate(json1_cards))
+
+    cards_data = {}
+    json1_count = 0
+    not_found_count = 0
+    skipped_count = 0
+    for status, result in outcomes:
+        json1_count += 1
+        if status == "error":
+            data_error_count += 1
+            skipped_count += 1
+            note("data_error", result)
+            continue
+
+        if status == "not_found":
+            note("not_found", result)
+            not_found_count += 1
+            skipped_count += 1
+            continue
+
+        for key, card_obj in result:
+            cards_data[key] = card_obj
+            if on_card is not None:
+                on_card(key, card_obj)
+
+    # Merge token.json
+    token_count = 0
+    count_before_token = len(cards_data)
+    if token_data is not None:
+        token_count = len(token_data)
+        cards_data.update(token_data)
+        if on_card is not None:
+            for key, card_obj in token_data.items():
+                on_card(key, card_obj)
+        print(f"Merged {token_count} tokens from {token_source}")
+
+    return cards_data, {
+        "json1_count": json1_count,
+        "json2_count": len(id_to_data),
+        "count_before_token": count_before_token,
+        "token_count": token_count,
+        "count_after_token": len(cards_data),
+        "not_found_count": not_found_count,
+        "data_error_count": data_error_count,
+        "skipped_count": skipped_count
     }
 
-def generate_cards_json(tmp_dir, output_path, res_dir="res"):
-    # Generate cards.json from json1.json
+def write_cards_json(cards_data, output_path, formats=()):
+    """
+    Writes cards.json with the same bytes as json.dump(indent=4, sort_keys=True), the
+    sidecar offset index for CardStore and any extra card_outputs formats, all in one
+    pass with inline SHA256 sidecars. Returns {format: {"path", "sha256", "size"}}.
+    """
+    minify = wants_minified(formats)
+    entries = (
+        (
+            key, format_card_entry(key, cards_data[key]).encode('utf-8'), cards_data[key].get("cardImage", key),
+            format_min_entry(key, cards_data[key]).encode('utf-8') if minify else None
+        )
+        for key in sorted(cards_data)
+    )
+    return write_entries(entries, output_path, formats)
+
+def write_entries(entries, output_path, formats=()):
+    # entries yields (key, format_card_entry bytes, cardImage, format_min_entry bytes or None) in key order.
+    with CardOutputs(output_path, formats) as outputs:
+        offsets = write_indexed_entries(outputs, outputs.entries(entries))
+    written = outputs.close()
+    for result in written.values():
+        add_written(result["size"])
+    save_offset_index(output_path, offsets)
+    if len(written) > 1:
+        sizes = [f"{os.path.basename(result['path'])} ({result['size'] / 1e6:.1f} MB)" for result in written.values()]
+        print(f"Wrote {', '.join(sizes)}.")
+    return written
+
+def format_card_entry(key, card_obj):
+    # Matches one member of json.dump(cards, indent=4, sort_keys=True) at nesting level 1.
+    value = json.dumps(as_dict(card_obj), ensure_ascii=False, indent=4, sort_keys=True)
+    return f"    {json.dumps(key, ensure_ascii=False)}: " + value.replace("\n", "\n    ")
+
+def format_min_entry(key, card_obj):
+    # The same member as the min.* formats write it, encoded from the card rather than re-parsed.
+    value = json.dumps(as_dict(card_obj), ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return json.dumps(key, ensure_ascii=False) + ":" + value
+
+def generate_cards_json_streaming(json1_path, json2_path, output_path, res_dir, limited_lists, typeline_map,
+                                  formats=()):
+    # Bounded-memory generate_cards_json: json1 cards are read one at a time and spooled to disk, and only
+    # the key -> spool offset index stays in memory. Returns True once the output is written.
+    print("Loading json2.json for name and description lookup (streaming)...")
+    try:
+        with open(json2_path, 'r', encoding='utf-8') as f:
+            id_to_data, invalid_json2_ids, data_error_count = load_json2_lookup(iter_object_members(f))
+    except (OSError, JsonStreamError) as e:
+        print(f"Error loading json2.json: {e}")
+        return
+
+    print(f"Loaded {len(id_to_data)} cards from json2.json.")
+
+    spool_path = output_path + ".spool"
+    spool_index = {}
+    minify = wants_minified(formats)
+    json1_count = 0
+    not_found_count = 0
+    skipped_count = 0
+    try:
+        with open(spool_path, 'wb+') as spool:
+            def spool_entry(key, card_obj):
+                # The minified entry, if needed, is spooled right after the pretty one.
+                data = format_card_entry(key, card_obj).encode('utf-8')
+                min_data = format_min_entry(key, card_obj).encode('utf-8') if minify else b""
+                spool_index[key] = (spool.tell(), len(data), card_obj.get("cardImage", key), len(min_data))
+                spool.write(data)
+                spool.write(min_data)
+
+            try:
+                with open(json1_path, 'r', encoding='utf-8') as f:
+                    for index, card in enumerate(iter_array_field(f, "data")):
+                        json1_count += 1
+                        try:
+                            variants = build_card_variants(
+                                card, index, id_to_data, invalid_json2_ids, limited_lists, typeline_map
+                            )
+                        except CardDataError as e:
+                            data_error_count += 1
+                            skipped_count += 1
+                            note("data_error", f"Data error: {e}. Skipping card.")
+                            continue
+                        if variants is None:
+                            note("not_found", f"Info: Card with id {card.get('id')} not found in json2. Skipping.")
+                            not_found_count += 1
+                            skipped_count += 1
+                            continue
+                        for key, card_obj in variants:
+                            spool_entry(key, card_obj)
+            except (OSError, JsonStreamError) as e:
+                print(f"Error loading json1.json: {e}")
+                return
+
+            print(f"Loaded {json1_count} cards from json1.json.")
+
+            # Merge token.json
+            token_path = os.path.join(res_dir, "token.json")
+            token_count = 0
+            count_before_token = len(spool_index)
+
+            if os.path.exists(token_path):
+                try:
+                    with open(token_path, 'r', encoding='utf-8') as f:
+                        token_data = json.load(f)
+                        token_count = len(token_data)
+                        for key, card_obj in token_data.items():
+                            spool_entry(key, card_obj)
+                        print(f"Merged {token_count} tokens from {token_path}")
+                except Exception as e:
+                    print(f"Error merging token.json: {e}")
+            else:
+                print(f"Warning: {token_path} not found.")
+
+            count_after_token = len(spool_index)
+
+            def spooled_entries():
+                for key in sorted(spool_index):
+                    offset, length, card_image, min_length = spool_index[key]
+                    spool.seek(offset)
+                    data = spool.read(length + min_length)
+                    yield key, data[:length], card_image, data[length:] if minify else None
+
+            write_entries(spooled_entries(), output_path, formats)
+    finally:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+    print_summary(json1_count, len(id_to_data), count_before_token, token_count, count_after_token,
+                  not_found_count, data_error_count, skipped_count)
+    return True
+
+def export_sqlite_from_output(output_path, sqlite_path):
+    # Reads the entries back from the written file so the streaming builder stays bounded in memory.
+    from .sqlite_export import export_cards_sqlite
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'r', encoding='utf-8') as f:
+        export_cards_sqlite(iter_object_members(f), sqlite_path)
+
+@stage("build")
+def generate_cards_json(tmp_dir, output_path, res_dir="res", streaming=False, incremental=False, sqlite_path=None,
+                        workers=None, formats=()):
+    # Generate cards.json from json1.json; returns True once it is written.
+    # streaming builds neither incrementally nor on workers; asking for that raises ValueError.
+    if streaming and (incremental or (workers and workers > 1)):
+        raise ValueError("streaming cannot be combined with incremental or workers")
     print("Generating cards.json from json1.json...")
     json1_path = os.path.join(tmp_dir, "json1.json")
     json2_path = os.path.join(tmp_dir, "json2.json")
@@ -173,6 +469,15 @@ def generate_cards_json(tmp_dir, output_path, res_dir="res"):
     typeline_map = load_typeline_conf(res_dir)
 
     if os.path.exists(json1_path) and os.path.exists(json2_path):
+        if streaming:
+            if not generate_cards_json_streaming(
+                json1_path, json2_path, output_path, res_dir, limited_lists, typeline_map, formats
+            ):
+                return False
+            if sqlite_path:
+                export_sqlite_from_output(output_path, sqlite_path)
+            return True
+
         # Load json2 to build a map of id -> data
         print("Loading json2.json for name and description lookup...")
         try:
@@ -186,18 +491,7 @@ def generate_cards_json(tmp_dir, output_path, res_dir="res"):
             print(f"Error loading json2.json: expected object, got {type_name(json2_data)}")
             return
 
-        id_to_data = {}
-        invalid_json2_ids = {}
-        data_error_count = 0
-        for source_key, card in json2_data.items():
-            try:
-                card_id, card_info = validate_json2_card(card, source_key)
-                id_to_data[card_id] = card_info
-            except CardDataError as e:
-                data_error_count += 1
-                if isinstance(card, dict) and is_int(card.get("id")):
-                    invalid_json2_ids[card["id"]] = str(e)
-                print(f"Data error: {e}. Skipping json2 entry.")
+        id_to_data, invalid_json2_ids, data_error_count = load_json2_lookup(json2_data.items())
 
         print(f"Loaded {len(id_to_data)} cards from json2.json.")
 
@@ -217,172 +511,42 @@ def generate_cards_json(tmp_dir, output_path, res_dir="res"):
             print(f"Error loading json1.json: field 'data' expected list, got {type_name(json1_cards)}")
             return
 
-        json1_count = len(json1_cards)
-        print(f"Loaded {json1_count} cards from json1.json.")
-
-        cards_data = {}
-        not_found_count = 0
-        skipped_count = 0
-        for index, card in enumerate(json1_cards):
-            try:
-                if not isinstance(card, dict):
-                    raise CardDataError(
-                        f"json1 data[{index}]: expected object, got {type_name(card)}"
-                    )
-
-                context = describe_card(card)
-                main_id = require_type(card, "id", "int", context)
-                image_ids = validate_image_ids(card)
-                card_info, _ = find_card_info(main_id, image_ids, id_to_data)
-
-                if not card_info:
-                    invalid_match_ids = [card_id for card_id in [main_id] + image_ids if card_id in invalid_json2_ids]
-                    if invalid_match_ids:
-                        invalid_id = invalid_match_ids[0]
-                        raise CardDataError(
-                            f"{context}: matching json2 card id {invalid_id} is invalid: {invalid_json2_ids[invalid_id]}"
-                        )
-                    print(f"Info: Card with id {main_id} not found in json2. Skipping.")
-                    not_found_count += 1
-                    skipped_count += 1
-                    continue
+        print(f"Loaded {len(json1_cards)} cards from json1.json.")
 
-                cn_name = card_info["name"]
-                desc = card_info["desc"]
-                pdesc = card_info["pdesc"]
-                types_str = card_info["types"]
-
-                # Determine cardType based on frameType
-                frame_type = require_type(card, "frameType", "str", context)
-                card_type = "monster"
-                if frame_type == "spell":
-                    card_type = "spell"
-                elif frame_type == "trap":
-                    card_type = "trap"
-
-                validated = validate_card_fields(card, card_type, frame_type)
-                processed_frame_type = validated["processed_frame_type"]
-                attribute = validated["attribute"]
-                min_id = min(image_ids)
-
-                for card_id in image_ids:
-                    # Use string of int for key (JSON requirement), int for values.
-                    unique_id = min_id
-                    card_obj = {
-                        "id": card_id,
-                        "uniqueId": unique_id,
-                        "cardImage": card_id,
-                        "name": cn_name,
-                        "description": desc,
-                        "cardType": card_type,
-                        "attribute": attribute,
-                        "frameType": processed_frame_type
-                    }
-
-                    # Add limited status
-                    limited_status = {}
-                    for format_name in ["ocg", "tcg", "md"]:
-                        if unique_id in limited_lists[format_name]:
-                            limited_status[format_name] = limited_lists[format_name][unique_id]
-
-                    if limited_status:
-                        card_obj["limit"] = limited_status
-
-                    if card_type in ["spell", "trap"]:
-                        card_obj["race"] = validated["race"]
-
-                    if card_type == "monster":
-                        card_obj["atk"] = card["atk"]
-
-                        # Construct typeline
-                        typeline_parts = []
-                        # 1. First element from json1 typeline, translated
-                        typeline = card.get("typeline", [])
-                        if typeline is None:
-                            raise CardDataError(
-                                f"{context}: field 'typeline' expected list, got null"
-                            )
-                        if not isinstance(typeline, list):
-                            raise CardDataError(
-                                f"{context}: field 'typeline' expected list, got {type_name(typeline)}"
-                            )
-                        if typeline:
-                            first_type = typeline[0]
-                            if not is_str(first_type):
-                                raise CardDataError(
-                                    f"{context}: field 'typeline[0]' expected str, got {type_name(first_type)}"
-                                )
-                            translated_first = typeline_map.get(first_type, first_type)
-                            typeline_parts.append(translated_first)
-
-                        # 2. Elements from json2 types, reversed
-                        if types_str:
-                            # Extract content inside [...]
-                            match = re.match(r"^\[(.*?)\]", types_str)
-                            if match:
-                                content = match.group(1)
-                                parts = content.split("|")
-                                if len(parts) > 1:
-                                    # Skip first, reverse the rest
-                                    remaining = parts[1:]
-                                    remaining.reverse()
-                                    typeline_parts.extend(remaining)
-
-                        if typeline_parts:
-                            card_obj["typeline"] = f"【{'/'.join(typeline_parts)}】"
-
-                        if not validated["is_link"]:
-                            card_obj["def"] = card["def"]
-                            card_obj["level"] = card["level"]
-                        else:
-                            card_obj["linkVal"] = card["linkval"]
-                            card_obj["linkMarkers"] = [m.lower() for m in card["linkmarkers"]]
-
-                        if validated["is_pendulum"]:
-                            card_obj["scale"] = card["scale"]
-                            card_obj["pendulumDescription"] = pdesc
-
-                    cards_data[str(card_id)] = card_obj
-            except CardDataError as e:
-                data_error_count += 1
-                skipped_count += 1
-                print(f"Data error: {e}. Skipping card.")
-
-        # Merge token.json
         token_path = os.path.join(res_dir, "token.json")
-        token_count = 0
-        count_before_token = len(cards_data)
-
+        token_data = None
         if os.path.exists(token_path):
             try:
                 with open(token_path, 'r', encoding='utf-8') as f:
                     token_data = json.load(f)
-                    token_count = len(token_data)
-                    cards_data.update(token_data)
-                    print(f"Merged {token_count} tokens from {token_path}")
             except Exception as e:
                 print(f"Error merging token.json: {e}")
         else:
             print(f"Warning: {token_path} not found.")
 
-        count_after_token = len(cards_data)
-
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(cards_data, f, ensure_ascii=False, indent=4, sort_keys=True)
-
-        print("-" * 30)
-        print(f"Summary:")
-        print(f"json1.json: {json1_count} cards")
-        print(f"json2.json: {len(id_to_data)} cards")
-        print(f"cards.json (before tokens): {count_before_token} cards")
-        print(f"token.json: {token_count} cards")
-        print(f"cards.json (final): {count_after_token} cards")
-        if not_found_count > 0:
-            print(f"Info skipped: {not_found_count} cards (not found in json2)")
-        if data_error_count > 0:
-            print(f"Data errors: {data_error_count} entries skipped")
-        if skipped_count > 0:
-            print(f"Skipped total: {skipped_count} cards")
-        print("-" * 30)
+        if incremental:
+            # Local import: incremental builds on this module.
+            from .incremental import CardCache, load_previous_build, write_cards_incremental
+            previous_cards, previous_state, previous_sha256 = load_previous_build(output_path)
+            card_cache = CardCache(previous_cards, previous_state)
+            cards_data, summary = build_cards_data(
+                json1_cards, (id_to_data, invalid_json2_ids, data_error_count),
+                limited_lists, typeline_map, token_data, token_path, card_cache, workers
+            )
+            write_cards_incremental(
+                cards_data, output_path, card_cache, previous_cards, previous_sha256, token_data, formats
+            )
+        else:
+            cards_data, summary = build_cards_data(
+                json1_cards, (id_to_data, invalid_json2_ids, data_error_count),
+                limited_lists, typeline_map, token_data, token_path, workers=workers
+            )
+            write_cards_json(cards_data, output_path, formats)
+        if sqlite_path:
+            from .sqlite_export import export_cards_sqlite
+            export_cards_sqlite(sorted(cards_data.items()), sqlite_path)
+        print_summary(**summary)
+        return True
     else:
         print(f"json1.json or json2.json not found, cannot generate cards.json.")
+        return False
@@ -0,0 +1,225 @@
+import sys
+
+# Declarative (field, kind, required) schemas for json1 and json2 records, compiled into one validator per
+# frameType class. Kinds: int, str, list, object, str_items, head_str (first item a str) and image_list.
+
+class CardDataError(Exception):
+    pass
+
+MISSING = object()
+
+JSON1_IDENTITY_SCHEMA = [
+    ("id", "int", True),
+    ("card_images", "image_list", True),
+]
+JSON1_FRAME_SCHEMA = [
+    ("frameType", "str", True),
+]
+SPELL_TRAP_SCHEMA = [
+    ("race", "str", True),
+]
+MONSTER_SCHEMA = [
+    ("attribute", "str", True),
+    ("atk", "int", True),
+]
+LINK_SCHEMA = [
+    ("linkval", "int", True),
+    ("linkmarkers", "str_items", True),
+]
+NON_LINK_SCHEMA = [
+    ("def", "int", True),
+    ("level", "int", True),
+]
+TYPELINE_SCHEMA = [
+    ("typeline", "head_str", False),
+]
+JSON2_SCHEMA = [
+    ("id", "int", True),
+    ("cn_name", "str", True),
+    ("text", "object", False),
+]
+JSON2_TEXT_SCHEMA = [
+    ("desc", "str", False),
+    ("pdesc", "str", False),
+    ("types", "str", False),
+]
+
+def type_name(value):
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+def describe_card(card):
+    card_id = card.get("id") if isinstance(card, dict) else None
+    name = card.get("name") if isinstance(card, dict) else None
+    if isinstance(name, str) and name:
+        return f"card id {card_id} ({name})"
+    return f"card id {card_id}"
+
+def report(errors, message):
+    # Fail fast when errors is None, otherwise collect.
+    if errors is None:
+        raise CardDataError(message)
+    errors.append(message)
+
+def compile_field(field, kind, required):
+    """
+    Returns check(obj, context, errors) for one field spec; context is a zero-argument
+    callable so the context string is only built for failures.
+    """
+    expected = {"int": int, "str": str, "list": list, "object": dict}.get(kind, list)
+    expected_name = "object" if expected is dict else expected.__name__
+
+    def check_type(obj, context, errors):
+        value = obj.get(field, MISSING)
+        if value is MISSING:
+            if required:
+                report(errors, f"{context()}: missing required field '{field}'")
+            return MISSING
+        if type(value) is not expected:
+            report(errors, f"{context()}: field '{field}' expected {expected_name}, got {type_name(value)}")
+            return MISSING
+        return value
+
+    if kind in ("int", "str", "list", "object"):
+        return check_type
+
+    if kind == "str_items":
+        def check_str_items(obj, context, errors):
+            value = check_type(obj, context, errors)
+            if value is not MISSING:
+                for index, item in enumerate(value):
+                    if type(item) is not str:
+                        report(errors, f"{context()}: field '{field}[{index}]' expected str, got {type_name(item)}")
+            return value
+        return check_str_items
+
+    if kind == "head_str":
+        def check_head_str(obj, context, errors):
+            value = check_type(obj, context, errors)
+            if value is not MISSING and value and type(value[0]) is not str:
+                report(errors, f"{context()}: field '{field}[0]' expected str, got {type_name(value[0])}")
+            return value
+        return check_head_str
+
+    if kind == "image_list":
+        def check_image_list(obj, context, errors):
+            value = check_type(obj, context, errors)
+            if value is MISSING:
+                return value
+            if not value:
+                report(errors, f"{context()}: field '{field}' must not be empty")
+            for index, image in enumerate(value):
+                if type(image) is not dict:
+                    report(errors, f"{context()} {field}[{index}]: expected object, got {type_name(image)}")
+                    continue
+                image_id = image.get("id", MISSING)
+                if image_id is MISSING:
+                    report(errors, f"{context()} {field}[{index}]: missing required field 'id'")
+                elif type(image_id) is not int:
+                    report(errors, f"{context()} {field}[{index}]: field 'id' expected int, got {type_name(image_id)}")
+            return value
+        return check_image_list
+
+    raise ValueError(f"unknown schema kind '{kind}'")
+
+def compile_schema(*schemas):
+    """
+    Compiles schemas into validate(obj, context, errors=None): fail-fast (raises
+    CardDataError) when errors is None, otherwise appends every violation to errors.
+    """
+    checks = tuple(compile_field(*spec) for schema in schemas for spec in schema)
+
+    def validate(obj, context, errors=None):
+        for check in checks:
+            check(obj, context, errors)
+    return validate
+
+def frame_class(frame_type):
+    # (card type, is_link, is_pendulum), the flags build_card_variants branches on.
+    if frame_type == "spell" or frame_type == "trap":
+        return frame_type, False, False
+    lowered = frame_type.lower()
+    return "monster", "link" in lowered, "pendulum" in lowered
+
+def frame_schemas(card_type, is_link, is_pendulum):
+    if card_type != "monster":
+        return [SPELL_TRAP_SCHEMA]
+    schemas = [MONSTER_SCHEMA, LINK_SCHEMA if is_link else NON_LINK_SCHEMA]
+    schemas.append([("scale", "int", is_pendulum)])
+    schemas.append(TYPELINE_SCHEMA)
+    return schemas
+
+validate_json1_identity = compile_schema(JSON1_IDENTITY_SCHEMA)
+validate_json1_frame_type = compile_schema(JSON1_FRAME_SCHEMA)
+validate_json2_fields = compile_schema(JSON2_SCHEMA)
+validate_json2_text = compile_schema(JSON2_TEXT_SCHEMA)
+
+FRAME_VALIDATORS = {}
+
+def frame_validator(frame_type):
+    """
+    Returns (frame class, compiled validator) for a frameType string; each distinct
+    frameType is classified and compiled once.
+    """
+    entry = FRAME_VALIDATORS.get(frame_type)
+    if entry is None:
+        flags = frame_class(frame_type)
+        entry = FRAME_VALIDATORS[frame_type] = (flags, compile_schema(*frame_schemas(*flags)))
+    return entry
+
+def json1_context(card):
+    return lambda: describe_card(card)
+
+def collect_json1_errors(card, index):
+    # Every schema violation of one json1 record, in fail-fast order.
+    if not isinstance(card, dict):
+        return [f"json1 data[{index}]: expected object, got {type_name(card)}"]
+    errors = []
+    context = json1_context(card)
+    validate_json1_identity(card, context, errors)
+    validate_json1_frame_type(card, context, errors)
+    frame_type = card.get("frameType")
+    if type(frame_type) is str:
+        frame_validator(frame_type)[1](card, context, errors)
+    return errors
+
+def collect_json2_errors(card, source_key):
+    context = lambda: f"json2 entry {source_key}"
+    if not isinstance(card, dict):
+        return [f"{context()}: expected object, got {type_name(card)}"]
+    errors = []
+    validate_json2_fields(card, context, errors)
+    text = card.get("text")
+    if type(text) is dict:
+        validate_json2_text(text, context, errors)
+    return errors
+
+def main(argv=None):
+    """
+    python -m src.card_schema tmp/json1.json [tmp/json2.json]
+    Prints every schema violation in the inputs in one pass.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(main.__doc__)
+        return 2
+    from .json_stream import iter_array_field, iter_object_members
+
+    total = 0
+    with open(argv[0], 'r', encoding='utf-8') as f:
+        for index, card in enumerate(iter_array_field(f, "data")):
+            for message in collect_json1_errors(card, index):
+                print(message)
+                total += 1
+    if len(argv) > 1:
+        with open(argv[1], 'r', encoding='utf-8') as f:
+            for source_key, card in iter_object_members(f):
+                for message in collect_json2_errors(card, source_key):
+                    print(message)
+                    total += 1
+    print(f"{total} violations found.")
+    return 1 if total else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
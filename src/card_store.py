@@ -0,0 +1,124 @@
+import os
+import json
+import mmap
+import functools
+from .utils import load_json_or_default, write_json_atomic
+
+# Random access to cards.json: a <name>.index.json sidecar records every key's byte offset, length and
+# cardImage, so single cards can be decoded without parsing the file.
+
+INDEX_VERSION = 1
+
+class CardStoreError(Exception):
+    pass
+
+def offset_index_path(cards_json_path):
+    base, _ = os.path.splitext(cards_json_path)
+    return f"{base}.index.json"
+
+def write_indexed_entries(out, entries):
+    """
+    Writes the cards.json object framing around pre-formatted entries to the binary file out.
+    entries yields (key, entry bytes from format_card_entry, cardImage) in key order.
+    Returns {key: [value offset, value length, cardImage]}.
+    """
+    offsets = {}
+    position = out.tell()
+    for key, data, card_image in entries:
+        separator = b",\n" if offsets else b"{\n"
+        out.write(separator)
+        position += len(separator)
+        # The value follows the '    "key": ' prefix written by format_card_entry.
+        prefix_length = len(f"    {json.dumps(key, ensure_ascii=False)}: ".encode('utf-8'))
+        offsets[key] = [position + prefix_length, len(data) - prefix_length, card_image]
+        out.write(data)
+        position += len(data)
+    out.write(b"\n}" if offsets else b"{}")
+    return offsets
+
+def save_offset_index(cards_json_path, offsets):
+    write_json_atomic(offset_index_path(cards_json_path), {
+        "version": INDEX_VERSION,
+        "size": os.path.getsize(cards_json_path),
+        "cards": offsets
+    }, separators=(",", ":"))
+
+def load_offset_index(cards_json_path, size):
+    # Returns the key -> [offset, length, cardImage] map, or None if missing or not for this file.
+    index = load_json_or_default(offset_index_path(cards_json_path), None, "offset index")
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION or index.get("size") != size:
+        return None
+    return index.get("cards")
+
+class CardStore:
+    # Read-only mapping of cards.json keys to cards decoded on demand from an mmap, with an LRU cache (returned
+    # dicts are shared); without a matching offset index the whole file is parsed once.
+
+    def __init__(self, cards_json_path, cache_size=4096):
+        self.path = cards_json_path
+        self.file = open(cards_json_path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.offsets = load_offset_index(cards_json_path, size)
+        self.cards = None
+        if self.offsets is None:
+            print(f"Warning: no offset index for {cards_json_path}, parsing the whole file.")
+            self.cards = json.loads(self.mm[:] if self.mm is not None else b"{}")
+        self.decode = functools.lru_cache(maxsize=cache_size)(self.decode_uncached)
+
+    def decode_uncached(self, key):
+        offset, length, _ = self.offsets[key]
+        data = self.mm[offset:offset + length]
+        if data[:1] != b"{" or data[-1:] != b"}":
+            raise CardStoreError(f"offset index of {self.path} does not match the file at key {key}")
+        return json.loads(data)
+
+    def keys(self):
+        return list(self.offsets if self.cards is None else self.cards)
+
+    def __len__(self):
+        return len(self.offsets if self.cards is None else self.cards)
+
+    def __contains__(self, key):
+        return str(key) in (self.offsets if self.cards is None else self.cards)
+
+    def __getitem__(self, key):
+        key = str(key)
+        if self.cards is not None:
+            return self.cards[key]
+        if key not in self.offsets:
+            raise KeyError(key)
+        return self.decode(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def card_image(self, key):
+        key = str(key)
+        if self.cards is not None:
+            return self.cards[key].get("cardImage", key)
+        return self.offsets[key][2]
+
+    def image_jobs(self):
+        # [(card_id, image_id)] for every card, read from the index without decoding any card.
+        return [(key, self.card_image(key)) for key in self.keys()]
+
+    def close(self):
+        self.decode.cache_clear()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
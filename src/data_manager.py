@@ -1,62 +1,95 @@
 import os
+import shutil
+import hashlib
 import zipfile
-import json
-from .utils import download_file, verify_md5
+from .utils import HashingReader, download_file, verify_md5
+from .cache import cached_download, derived_dir_for, get_derived, link_cached, record_derived
+from .instrumentation import stage
 
-def process_json2(tmp_dir):
+JSON2_ZIP_URL = "https://ygocdb.com/api/v0/cards.zip"
+JSON2_MD5_URL = "https://ygocdb.com/api/v0/cards.zip.md5"
+JSON1_URL = "https://db.ygoprodeck.com/api/v7/cardinfo.php"
+
+def extract_member_with_md5(zip_path, member_name, output_path):
+    """
+    Decompresses one zip member straight to output_path, hashing it on the way.
+    Returns the MD5 hex digest of the member, or None if the member is missing.
+    """
+    hash_md5 = hashlib.md5()
+    tmp_path = output_path + ".part"
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        try:
+            member = zip_ref.open(member_name)
+        except KeyError:
+            return None
+        with member, open(tmp_path, 'wb') as out:
+            shutil.copyfileobj(HashingReader(member, hash_md5), out, 1 << 20)
+    os.replace(tmp_path, output_path)
+    return hash_md5.hexdigest()
+
+def process_json2_cached(tmp_dir, cache_dir, zip_url, md5_url):
+    zip_cache_path, entry, modified = cached_download(zip_url, cache_dir)
+    json2_path = os.path.join(tmp_dir, "json2.json")
+    derived_dir = derived_dir_for(cache_dir, zip_url)
+    cached_json2 = os.path.join(derived_dir, "cards.json")
+
+    if modified or get_derived(entry, "md5_verified") is not True or not os.path.exists(cached_json2):
+        print("Decompressing cards.json from cards.zip...")
+        calculated_md5 = extract_member_with_md5(zip_cache_path, "cards.json", cached_json2)
+        if calculated_md5 is None:
+            print(f"Expected cards.json not found in {zip_cache_path}.")
+            return
+        verified = verify_md5(cached_json2, md5_url, calculated_md5)
+        record_derived(cache_dir, zip_url, "md5_verified", verified)
+        if not verified:
+            print("MD5 verification failed for the extracted file.")
+            return
+    else:
+        print("Reusing cached cards.json extraction.")
+
+    if link_cached(cached_json2, json2_path):
+        print(f"Linked {cached_json2} to {json2_path}")
+
+@stage("json2")
+def process_json2(tmp_dir, cache_dir=None):
     # Json2 (ygocdb)
-    zip_url = "https://ygocdb.com/api/v0/cards.zip"
-    md5_url = "https://ygocdb.com/api/v0/cards.zip.md5"
+    zip_url = JSON2_ZIP_URL
+    md5_url = JSON2_MD5_URL
     zip_path = os.path.join(tmp_dir, "cards.zip")
 
+    if cache_dir:
+        process_json2_cached(tmp_dir, cache_dir, zip_url, md5_url)
+        return
+
     # Always download to ensure we have the file
     download_file(zip_url, zip_path)
 
-    print("Unzipping cards.zip...")
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(tmp_dir)
-
-    # The extracted file is expected to be 'cards.json'
-    extracted_file = os.path.join(tmp_dir, "cards.json")
+    print("Decompressing cards.json from cards.zip...")
+    json2_path = os.path.join(tmp_dir, "json2.json")
+    calculated_md5 = extract_member_with_md5(zip_path, "cards.json", json2_path)
 
-    if os.path.exists(extracted_file):
-        # Verify MD5 of the extracted JSON file
-        if verify_md5(extracted_file, md5_url):
-            json2_path = os.path.join(tmp_dir, "json2.json")
-            if os.path.exists(json2_path):
-                os.remove(json2_path)
-            os.rename(extracted_file, json2_path)
-            print(f"Renamed {extracted_file} to {json2_path}")
+    if calculated_md5 is not None:
+        # Verify MD5 computed while the member was decompressed
+        if verify_md5(json2_path, md5_url, calculated_md5):
+            print(f"Decompressed cards.json to {json2_path}")
 
             # Clean up zip file
             if os.path.exists(zip_path):
                 os.remove(zip_path)
                 print(f"Removed {zip_path}")
         else:
+            os.remove(json2_path)
             print("MD5 verification failed for the extracted file.")
     else:
-        print(f"Expected extracted file {extracted_file} not found.")
+        print(f"Expected cards.json not found in {zip_path}.")
 
-def process_json1(tmp_dir):
+@stage("json1")
+def process_json1(tmp_dir, cache_dir=None):
     # Json1 (ygoprodeck)
-    json1_url = "https://db.ygoprodeck.com/api/v7/cardinfo.php"
+    json1_url = JSON1_URL
     json1_path = os.path.join(tmp_dir, "json1.json")
-    download_file(json1_url, json1_path)
-
-def format_json_files(tmp_dir):
-    # Format JSON files
-    for filename in ["json1.json", "json2.json"]:
-        filepath = os.path.join(tmp_dir, filename)
-        if os.path.exists(filepath):
-            print(f"Formatting {filename}...")
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
-                print(f"Formatted {filename} successfully.")
-            except Exception as e:
-                print(f"Error formatting {filename}: {e}")
-        else:
-            print(f"{filename} not found.")
+    if cache_dir:
+        cached_path, _, _ = cached_download(json1_url, cache_dir)
+        link_cached(cached_path, json1_path)
+    else:
+        download_file(json1_url, json1_path)
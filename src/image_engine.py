@@ -0,0 +1,355 @@
+import time
+import queue
+import random
+import asyncio
+import threading
+import contextvars
+import collections
+import concurrent.futures
+from email.utils import parsedate_to_datetime
+
+RATE_LIMIT = 20
+CONCURRENCY = 20
+INITIAL_CONCURRENCY = 4
+MAX_ATTEMPTS = 4
+DECREASE_FACTOR = 0.7
+HEDGE_PERCENTILE = 95
+
+# Responses that mean the CDN wants us to slow down; connection and TLS errors report status None.
+CONGESTION_STATUSES = {None, 429, 503}
+RETRYABLE_STATUSES = {None, 408, 425, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    asyncio token bucket: acquire() returns once a request may be sent.
+    rate is tokens per second and may be changed while running, burst the
+    number of tokens that may accumulate while idle.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds):
+        # Hold every request until the given delay has passed (Retry-After).
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    self.updated = time.monotonic()
+                    self.tokens = 0
+                    continue
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def parse_retry_after(value):
+    # Retry-After is either delta-seconds or an HTTP date; returns seconds or None.
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class AdaptiveController:
+    # AIMD control of concurrency and rate: clean responses grow both, congestion (429/503, connection errors)
+    # cuts them by DECREASE_FACTOR at most once per second, and Retry-After pauses all requests.
+
+    def __init__(self, max_rate=RATE_LIMIT, max_concurrency=CONCURRENCY,
+                 initial_concurrency=INITIAL_CONCURRENCY, min_rate=1.0):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.bucket = TokenBucket(max_rate)
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.congestion_events = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        await self.bucket.acquire()
+
+    async def release(self, status, retry_after=None):
+        async with self.condition:
+            self.in_flight -= 1
+            if status in CONGESTION_STATUSES:
+                self.on_congestion(retry_after)
+            elif 200 <= status < 300 or status == 304:
+                # Other 4xx (missing or forbidden images) say nothing about server capacity.
+                self.on_success()
+            self.condition.notify_all()
+
+    async def cancel(self):
+        # Gives back a slot that was acquired but not used for a request.
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + 1 / self.bucket.rate)
+
+    def on_congestion(self, retry_after):
+        self.congestion_events += 1
+        now = time.monotonic()
+        if now - self.last_decrease >= 1.0:
+            self.limit = max(1.0, self.limit * DECREASE_FACTOR)
+            self.bucket.rate = max(self.min_rate, self.bucket.rate * DECREASE_FACTOR)
+            self.last_decrease = now
+        if retry_after:
+            self.bucket.pause(retry_after)
+
+class HedgePolicy:
+    """
+    When a request has been outstanding long enough to send a duplicate to the next
+    source: after the given percentile of recent request latencies, or initial_delay
+    until min_samples of them are in.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, window=200, min_samples=20, initial_delay=1.0, min_delay=0.05):
+        self.percentile = percentile
+        self.latencies = collections.deque(maxlen=window)
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.hedged = 0
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def delay(self):
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self.latencies)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))])
+
+class FetchClaim:
+    """
+    Shared by the requests for one job; the first to take() it writes the result, the
+    others discard theirs (and may stop early once taken is set).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.taken = False
+
+    def take(self):
+        with self.lock:
+            if self.taken:
+                return False
+            self.taken = True
+            return True
+
+class JobFeed:
+    """
+    Thread-safe job source for run_adaptive: a producer put()s jobs while the engine
+    is already downloading, and close() ends the run once the queued jobs are done.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def put(self, job):
+        self.queue.put(job)
+
+    def close(self):
+        self.queue.put(None)
+
+    def get(self):
+        # Blocks until the next job arrives; None once the feed is closed.
+        return self.queue.get()
+
+def retry_delay(attempt, retry_after):
+    if retry_after:
+        return retry_after
+    return min(30.0, 0.5 * 2 ** (attempt - 1)) * (0.5 + random.random())
+
+async def run_adaptive(jobs, fetch, needs_request=None, rate=RATE_LIMIT, concurrency=CONCURRENCY,
+                       max_attempts=MAX_ATTEMPTS, sources=1, hedge=None, latencies=None):
+    # Runs fetch(job) for every job (a list or a JobFeed) under an AdaptiveController, re-queueing retryable
+    # failures; with sources > 1 failures and hedged stragglers move on to the next source, first success wins.
+    # Returns (success_count, failed_jobs).
+    loop = asyncio.get_running_loop()
+    controller = AdaptiveController(max_rate=rate, max_concurrency=concurrency)
+    queue = asyncio.Queue()
+    streaming = isinstance(jobs, JobFeed)
+    state = {"outstanding": 0, "total": 0, "done": 0, "success": 0, "retried": 0, "feeding": streaming}
+    wins = collections.Counter()
+    background = set()
+    failed_jobs = []
+
+    def add(job):
+        state["outstanding"] += 1
+        state["total"] += 1
+        queue.put_nowait((job, 1))
+
+    def stop_workers():
+        for _ in range(concurrency):
+            queue.put_nowait(None)
+
+    if not streaming:
+        for job in jobs:
+            add(job)
+
+    def finish(job, ok):
+        state["outstanding"] -= 1
+        state["done"] += 1
+        if ok:
+            state["success"] += 1
+        else:
+            failed_jobs.append(job)
+        if state["done"] % 100 == 0:
+            print(f"Processed {state['done']}/{state['total']} images "
+                  f"(concurrency {int(controller.limit)}, {controller.bucket.rate:.1f} req/s)...", end='\r')
+        if state["outstanding"] == 0 and not state["feeding"]:
+            stop_workers()
+
+    async def feed():
+        # Moves jobs from the producer thread into the queue as they arrive.
+        while True:
+            job = await loop.run_in_executor(None, jobs.get)
+            if job is None:
+                break
+            add(job)
+        state["feeding"] = False
+        if state["outstanding"] == 0:
+            stop_workers()
+
+    async def fetch_from_sources(executor, job):
+        # One attempt over the sources; returns the winning result, else the most retryable failure.
+        claim = FetchClaim()
+        results = asyncio.Queue()
+        launched = 0
+        running = 0
+        started = last_sent = None
+        hedging = hedge is not None
+
+        async def request(source):
+            sent = time.monotonic()
+            try:
+                context = contextvars.copy_context()
+                result = await loop.run_in_executor(executor, context.run, fetch, job, source, claim)
+            except Exception:
+                result = (False, None, None)
+            if hedge is not None and result[1] == 200:
+                # Every answered request, losers included, so slow ones shape the hedge delay too.
+                hedge.record(time.monotonic() - sent)
+            await controller.release(result[1], result[2])
+            results.put_nowait((source, result))
+
+        async def launch():
+            # Takes a slot and a token like any other request; False if the job finished meanwhile.
+            nonlocal launched, running, started, last_sent
+            await controller.acquire()
+            if claim.taken:
+                await controller.cancel()
+                return False
+            task = asyncio.ensure_future(request(launched))
+            # Losing duplicates outlive this attempt; keep them referenced until they finish.
+            background.add(task)
+            task.add_done_callback(background.discard)
+            launched += 1
+            running += 1
+            # Latencies count from the first request sent and hedge delays from the last one,
+            # not from the wait for a slot.
+            last_sent = time.monotonic()
+            started = started or last_sent
+            return True
+
+        await launch()
+        failure = None
+        while running:
+            timeout = None
+            if hedging and launched < sources:
+                timeout = max(0.0, last_sent + hedge.delay() - time.monotonic())
+            try:
+                source, result = await asyncio.wait_for(results.get(), timeout)
+            except asyncio.TimeoutError:
+                # No more duplicates once a request has won; its result is on the way.
+                hedging = await launch()
+                hedge.hedged += hedging
+                continue
+            running -= 1
+            if result[0]:
+                if latencies is not None:
+                    latencies.append(time.monotonic() - started)
+                wins[source] += 1
+                return result
+            # Retry the job if any source failed in a way worth retrying.
+            if failure is None or (failure[1] not in RETRYABLE_STATUSES and result[1] in RETRYABLE_STATUSES):
+                failure = result
+            if not running and launched < sources:
+                await launch()
+        return failure
+
+    async def worker(executor):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            job, attempt = item
+            if needs_request is not None and not needs_request(job):
+                finish(job, True)
+                continue
+
+            if sources > 1:
+                ok, status, retry_after = await fetch_from_sources(executor, job)
+            else:
+                await controller.acquire()
+                try:
+                    # Executor threads get this task's context, i.e. the caller's instrumentation stage.
+                    context = contextvars.copy_context()
+                    ok, status, retry_after = await loop.run_in_executor(executor, context.run, fetch, job)
+                except Exception:
+                    ok, status, retry_after = False, None, None
+                await controller.release(status, retry_after)
+
+            if ok:
+                finish(job, True)
+            elif status in RETRYABLE_STATUSES and attempt < max_attempts:
+                state["retried"] += 1
+                loop.call_later(retry_delay(attempt, retry_after), queue.put_nowait, (job, attempt + 1))
+            else:
+                finish(job, False)
+
+    if state["total"] or streaming:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            tasks = [worker(executor) for _ in range(concurrency)]
+            if streaming:
+                tasks.append(feed())
+            await asyncio.gather(*tasks)
+            # Duplicates that lost the race discard what they get, but must not outlive the run.
+            await asyncio.gather(*background)
+        finally:
+            executor.shutdown()
+    print(f"\nProcessed {state['done']}/{state['total']} images, {state['retried']} retries, "
+          f"{controller.congestion_events} congestion signals.")
+    if sources > 1:
+        by_source = ", ".join(f"source {source}: {count}" for source, count in sorted(wins.items()))
+        hedged = f", {hedge.hedged} hedged requests" if hedge is not None else ""
+        print(f"Images per source: {by_source or 'none'}{hedged}.")
+    return state["success"], failed_jobs
@@ -1,76 +1,154 @@
 import os
-import json
 import time
+import hashlib
+import asyncio
 import requests
+import threading
+import contextvars
 import concurrent.futures
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from .card_store import CardStore
+from .card_model import image_jobs
+from .shards import shard_jobs
+from .instrumentation import add_written, note, record_request, stage
+from .image_engine import (
+    CONCURRENCY, HEDGE_PERCENTILE, RATE_LIMIT, HedgePolicy, JobFeed, parse_retry_after, run_adaptive
+)
+from .image_manifest import (
+    ManifestRecorder, apply_local_plan, dedupe_by_content, link_or_copy, load_manifest,
+    manifest_path_for, plan_image_sync, save_manifest
+)
 
-def create_session():
+IMAGE_URL_TEMPLATE = "https://images.ygoprodeck.com/images/cards_cropped/{image_id}.jpg"
+
+# Wherever a url_template is taken, a list of them also works: the primary source first,
+# then mirrors. A template without http(s):// is a local path, e.g. "/mnt/fig-cache/{image_id}.jpg".
+
+def image_sources(url_template):
+    return [url_template] if isinstance(url_template, str) else list(url_template)
+
+def is_local_source(url):
+    return not url.startswith(("http://", "https://"))
+
+def local_image_chunks(path):
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(65536), b"")
+
+def save_image_chunks(chunks, tmp_path, claim=None):
+    # Writes and hashes chunks into tmp_path; returns (size, sha256), or None once claim is taken elsewhere.
+    hash_sha256 = hashlib.sha256()
+    size = 0
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            if claim is not None and claim.taken:
+                return None
+            f.write(chunk)
+            hash_sha256.update(chunk)
+            size += len(chunk)
+    return size, hash_sha256.hexdigest()
+
+def create_session(pool_maxsize=10, retries=True):
     session = requests.Session()
-    retry = Retry(
-        total=3,
-        read=3,
-        connect=3,
-        backoff_factor=0.5,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    adapter = HTTPAdapter(max_retries=retry)
+    if retries:
+        retry = Retry(
+            total=3,
+            read=3,
+            connect=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+        )
+    else:
+        # The adaptive engine sees every failure itself and decides when to retry.
+        retry = Retry(total=0, read=False, connect=0, redirect=3, status=0)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
 
-def download_single_image(card_id, image_id, output_dir, session=None):
-    """
-    Downloads a single image for the given card_id using image_id for URL.
-    Saves it as <card_id>.png in output_dir.
-    Returns True if successful (or already exists), False otherwise.
-    """
-    url = f"https://images.ygoprodeck.com/images/cards_cropped/{image_id}.jpg"
+def fetch_image(card_id, image_id, output_dir, session=None, url_template=IMAGE_URL_TEMPLATE,
+                on_saved=None, overwrite=False, claim=None):
+    # Like download_single_image but returns (ok, status, retry_after) and calls on_saved after writing;
+    # of duplicate requests sharing a claim, only the first to finish writes the file.
+    url = url_template.format(image_id=image_id)
     file_path = os.path.join(output_dir, f"{card_id}.png")
 
     # Skip if already exists
-    if os.path.exists(file_path):
-        return True
+    if not overwrite and os.path.exists(file_path):
+        return True, 200, None
 
     if session is None:
         session = requests
 
+    # Stream into a temporary file and rename it into place, so an interrupted
+    # transfer never leaves a truncated image under the final name. Duplicates of
+    # one request run on different threads and each get their own file.
+    tmp_path = file_path + (".part" if claim is None else f".{threading.get_ident()}.part")
+    request_start = time.perf_counter()
     try:
-        response = session.get(url, timeout=20)
-        if response.status_code == 200:
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            return True
+        if is_local_source(url):
+            path = url[len("file://"):] if url.startswith("file://") else url
+            if not os.path.isfile(path):
+                return False, 404, None
+            saved = save_image_chunks(local_image_chunks(path), tmp_path, claim)
+            etag = None
         else:
-            return False
+            with session.get(url, timeout=20, stream=True) as response:
+                if response.status_code != 200:
+                    record_request(response.status_code, time.perf_counter() - request_start)
+                    return False, response.status_code, parse_retry_after(response.headers.get("Retry-After"))
+                saved = save_image_chunks(response.iter_content(chunk_size=65536), tmp_path, claim)
+                etag = response.headers.get("ETag")
+            record_request(200, time.perf_counter() - request_start, saved[0] if saved else 0)
+        if saved is None or (claim is not None and not claim.take()):
+            os.remove(tmp_path)
+            return False, 200, None
+        size, sha256 = saved
+        add_written(size)
+        os.replace(tmp_path, file_path)
+        if on_saved is not None:
+            on_saved(card_id, image_id, size, sha256, etag)
+        return True, 200, None
     except Exception as e:
-        print(f"Error downloading image for {card_id} (Image ID: {image_id}): {e}")
-        return False
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        record_request(None, time.perf_counter() - request_start)
+        note("image_error", f"Error downloading image for {card_id} (Image ID: {image_id}): {e}")
+        return False, None, None
 
-def download_images(cards_json_path, output_dir):
+def download_single_image(card_id, image_id, output_dir, session=None, url_template=IMAGE_URL_TEMPLATE,
+                          on_saved=None, overwrite=False):
     """
-    Reads cards.json and downloads images for all cards to output_dir.
-    Respects rate limit of 20 req/s.
+    Downloads a single image for the given card_id using image_id for URL.
+    Saves it as <card_id>.png in output_dir.
+    Returns True if successful (or already exists), False otherwise.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Created directory: {output_dir}")
+    ok, _, _ = fetch_image(card_id, image_id, output_dir, session, url_template, on_saved, overwrite)
+    return ok
 
-    print(f"Loading cards from {cards_json_path}...")
-    if not os.path.exists(cards_json_path):
-        print(f"Error: {cards_json_path} not found.")
-        return
+def load_image_jobs(cards_json_path):
+    # Returns [(card_id, image_id)] for every card in cards.json, from the offset index when present.
+    with CardStore(cards_json_path) as store:
+        return store.image_jobs()
 
-    with open(cards_json_path, 'r', encoding='utf-8') as f:
-        cards_data = json.load(f)
-
-    card_ids = list(cards_data.keys())
-    total_cards = len(card_ids)
-    print(f"Found {total_cards} cards. Starting image download to '{output_dir}'...")
-    print("Note: Rate limiting enabled. Reduced speed to avoid SSL errors.")
+def timed_call(latencies, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    latencies.append(time.perf_counter() - start)
+    return result
 
+def download_images_threaded(jobs, output_dir, url_template=IMAGE_URL_TEMPLATE, latencies=None,
+                             on_saved=None, overwrite=False):
+    """
+    Legacy engine: paces submissions with a fixed delay in front of a thread pool.
+    Only the primary source is used.
+    Returns (success_count, failed_ids).
+    """
+    if latencies is None:
+        latencies = []
+    url_template = image_sources(url_template)[0]
     delay = 0.06
+    total_cards = len(jobs)
 
     session = create_session()
     failed_ids = []
@@ -79,11 +157,11 @@ def download_images(cards_json_path, output_dir):
     # Use ThreadPoolExecutor for parallelism
     with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:
         future_to_card = {}
-        for i, card_id in enumerate(card_ids):
-            card_info = cards_data.get(card_id, {})
-            image_id = card_info.get("cardImage", card_id)
-
-            future = executor.submit(download_single_image, card_id, image_id, output_dir, session)
+        for i, (card_id, image_id) in enumerate(jobs):
+            future = executor.submit(
+                contextvars.copy_context().run, timed_call, latencies, download_single_image, card_id, image_id,
+                output_dir, session, url_template, on_saved, overwrite
+            )
             future_to_card[future] = card_id
 
             time.sleep(delay)
@@ -103,26 +181,219 @@ def download_images(cards_json_path, output_dir):
             except Exception:
                 failed_ids.append(card_id)
 
-    # Retry logic for failed IDs
-    final_failed_ids = []
-    if failed_ids:
+    return success_count, failed_ids
+
+def adaptive_fetch(output_dir, session, url_template, on_saved=None, overwrite=False,
+                   hedge_percentile=HEDGE_PERCENTILE):
+    # Returns (fetch, options) for run_adaptive; with several templates fetch takes (job, source, claim) and
+    # options turn on the fallback through the sources and, unless hedge_percentile is falsy, hedging.
+    templates = image_sources(url_template)
+    if len(templates) == 1:
+        def fetch(job):
+            card_id, image_id = job
+            return fetch_image(card_id, image_id, output_dir, session, templates[0], on_saved, overwrite)
+        return fetch, {}
+
+    def fetch(job, source, claim):
+        card_id, image_id = job
+        return fetch_image(card_id, image_id, output_dir, session, templates[source], on_saved, overwrite, claim)
+    return fetch, {"sources": len(templates), "hedge": HedgePolicy(hedge_percentile) if hedge_percentile else None}
+
+def download_images_async(jobs, output_dir, url_template=IMAGE_URL_TEMPLATE, latencies=None,
+                          rate=RATE_LIMIT, concurrency=CONCURRENCY, on_saved=None, overwrite=False,
+                          hedge_percentile=HEDGE_PERCENTILE):
+    # asyncio engine: AIMD-controlled concurrency and rate (capped at rate), failed images re-queued into the
+    # same pipeline, one shared keep-alive pool. Returns (success_count, failed_ids).
+    if latencies is None:
+        latencies = []
+    session = create_session(pool_maxsize=concurrency, retries=False)
+
+    def needs_request(job):
+        return not os.path.exists(os.path.join(output_dir, f"{job[0]}.png"))
+
+    fetch, options = adaptive_fetch(output_dir, session, url_template, on_saved, overwrite, hedge_percentile)
+    if options:
+        options["latencies"] = latencies
+    else:
+        fetch_one = fetch
+        fetch = lambda job: timed_call(latencies, fetch_one, job)
+
+    success_count, failed_jobs = asyncio.run(
+        run_adaptive(jobs, fetch, None if overwrite else needs_request, rate=rate, concurrency=concurrency, **options)
+    )
+    return success_count, [card_id for card_id, _ in failed_jobs]
+
+class ImagePrefetcher:
+    # Fetches images while cards.json is still being built; download_images runs afterwards and only
+    # links, prunes and retries what is left.
+
+    def __init__(self, output_dir, url_template=IMAGE_URL_TEMPLATE, hedge_percentile=HEDGE_PERCENTILE):
+        self.output_dir = output_dir
+        self.url_template = url_template
+        self.hedge_percentile = hedge_percentile
+        self.feed = JobFeed()
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.manifest_path = manifest_path_for(output_dir)
+        self.manifest = load_manifest(self.manifest_path)
+        # Same rules as plan_image_sync: a manifest entry whose file has the recorded size is
+        # up to date, and an untracked file is adopted, so neither is fetched again.
+        with os.scandir(output_dir) as entries:
+            self.present = {entry.name: entry.stat().st_size for entry in entries if entry.is_file()}
+        self.seen = {
+            entry.get("cardImage") for card_id, entry in self.manifest.items()
+            if self.present.get(f"{card_id}.png") == entry.get("size")
+        }
+
+    def submit(self, card_id, image_id):
+        if image_id in self.seen:
+            return
+        self.seen.add(image_id)
+        if str(card_id) not in self.manifest and f"{card_id}.png" in self.present:
+            return
+        self.feed.put((card_id, image_id))
+
+    def close(self):
+        self.feed.close()
+
+    def run(self):
+        recorder = ManifestRecorder(self.manifest_path, self.manifest)
+        session = create_session(pool_maxsize=CONCURRENCY, retries=False)
+
+        fetch, options = adaptive_fetch(
+            self.output_dir, session, self.url_template, recorder.record, True, self.hedge_percentile
+        )
+
+        print(f"Prefetching images into '{self.output_dir}' while cards are built...")
+        with stage("prefetch"):
+            try:
+                success_count, failed_jobs = asyncio.run(run_adaptive(self.feed, fetch, **options))
+            finally:
+                recorder.flush()
+        if failed_jobs:
+            print(f"Prefetch left {len(failed_jobs)} images for the image sync to retry.")
+        return success_count, failed_jobs
+
+def run_image_engine(jobs, output_dir, engine, recorder, url_template=IMAGE_URL_TEMPLATE,
+                     hedge_percentile=HEDGE_PERCENTILE):
+    # Downloads (card_id, image_id) jobs with the chosen engine; returns (success_count, failed_ids).
+    image_ids = dict(jobs)
+    if engine == "threaded":
+        print("Note: Rate limiting enabled. Reduced speed to avoid SSL errors.")
+        success_count, failed_ids = download_images_threaded(
+            jobs, output_dir, url_template, on_saved=recorder.record, overwrite=True
+        )
+        if not failed_ids:
+            return success_count, []
+        # Failures go through the adaptive pipeline rather than a serial retry loop.
         print(f"\nRetrying {len(failed_ids)} failed downloads...")
-        retry_success_count = 0
-        for i, card_id in enumerate(failed_ids):
-            print(f"Retrying {i+1}/{len(failed_ids)}: {card_id}...", end='\r')
-
-            # Get image_id again for retry
-            card_info = cards_data.get(card_id, {})
-            image_id = card_info.get("cardImage", card_id)
-
-            # Retry with a fresh session or existing one, slightly slower to be safe
-            time.sleep(0.1)
-            if download_single_image(card_id, image_id, output_dir, session):
-                retry_success_count += 1
-                success_count += 1
-            else:
-                final_failed_ids.append(card_id)
-        print(f"\nRetry finished. Recovered {retry_success_count}/{len(failed_ids)}.")
+        retry_jobs = [(card_id, image_ids.get(card_id, card_id)) for card_id in failed_ids]
+        retry_success_count, final_failed_ids = download_images_async(
+            retry_jobs, output_dir, url_template, on_saved=recorder.record, overwrite=True,
+            hedge_percentile=hedge_percentile
+        )
+        print(f"Retry finished. Recovered {retry_success_count}/{len(failed_ids)}.")
+        return success_count + retry_success_count, final_failed_ids
+
+    print(f"Note: Adaptive rate control up to {RATE_LIMIT} req/s and {CONCURRENCY} connections.")
+    return download_images_async(
+        jobs, output_dir, url_template, on_saved=recorder.record, overwrite=True, hedge_percentile=hedge_percentile
+    )
+
+def group_jobs_by_image(jobs):
+    # image_id -> [card_id, ...] in job order, so each distinct cardImage is fetched once.
+    groups = {}
+    for card_id, image_id in jobs:
+        groups.setdefault(image_id, []).append(card_id)
+    return groups
+
+def link_card_images(output_dir, source_card_id, target_card_ids, recorder):
+    source_path = os.path.join(output_dir, f"{source_card_id}.png")
+    source_entry = recorder.manifest.get(str(source_card_id))
+    for card_id in target_card_ids:
+        link_or_copy(source_path, os.path.join(output_dir, f"{card_id}.png"))
+        if source_entry:
+            recorder.record(card_id, source_entry["cardImage"], source_entry["size"],
+                            source_entry["sha256"], source_entry.get("etag"))
+
+@stage("images")
+def download_images(cards_json_path, output_dir, engine="async", verify=False, url_template=IMAGE_URL_TEMPLATE,
+                    cards=None, shard=None, hedge_percentile=HEDGE_PERCENTILE):
+    """
+    Reads cards.json (or uses cards) and syncs images into output_dir, fetching only new, changed
+    or missing images. Respects rate limit of 20 req/s.
+    Returns {"total", "succeeded", "failed"}, or None if cards_json_path does not exist.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Created directory: {output_dir}")
+
+    if cards is not None:
+        jobs = image_jobs(cards)
+    else:
+        print(f"Loading cards from {cards_json_path}...")
+        if not os.path.exists(cards_json_path):
+            print(f"Error: {cards_json_path} not found.")
+            return
+        jobs = load_image_jobs(cards_json_path)
+    if shard is not None:
+        jobs = shard_jobs(jobs, *shard)
+        print(f"Shard {shard[0]}/{shard[1]}: {len(jobs)} cards.")
+    total_cards = len(jobs)
+    print(f"Found {total_cards} cards. Planning image sync for '{output_dir}'...")
+
+    with stage("plan"):
+        manifest_path = manifest_path_for(output_dir)
+        manifest = load_manifest(manifest_path)
+        plan = plan_image_sync(jobs, manifest, output_dir, verify)
+        apply_local_plan(plan, output_dir, manifest)
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(plan["reasons"].items()))
+        print(f"Unchanged: {plan['unchanged']}. To sync: {len(plan['download'])}. ({reasons or 'no changes'})")
+
+    # Images that an up-to-date card already has on disk can be linked instead of fetched.
+    pending_ids = {str(card_id) for card_id, _ in plan["download"]}
+    local_sources = {}
+    for card_id, entry in manifest.items():
+        if card_id not in pending_ids:
+            local_sources.setdefault(entry.get("cardImage"), card_id)
+
+    recorder = ManifestRecorder(manifest_path, manifest)
+    fetch_jobs = []
+    followers = {}
+    linked_count = 0
+    for image_id, card_ids in group_jobs_by_image(plan["download"]).items():
+        if image_id in local_sources:
+            link_card_images(output_dir, local_sources[image_id], card_ids, recorder)
+            linked_count += len(card_ids)
+        else:
+            fetch_jobs.append((card_ids[0], image_id))
+            followers[card_ids[0]] = card_ids[1:]
+    print(f"Distinct images to fetch: {len(fetch_jobs)} (linked from existing files: {linked_count}).")
+
+    with stage("fetch"):
+        try:
+            success_count, failed_primaries = run_image_engine(
+                fetch_jobs, output_dir, engine, recorder, url_template, hedge_percentile
+            )
+            failed_set = set(failed_primaries)
+            final_failed_ids = []
+            for card_id, image_id in fetch_jobs:
+                if card_id in failed_set:
+                    final_failed_ids.append(card_id)
+                    final_failed_ids.extend(followers[card_id])
+                elif followers[card_id]:
+                    link_card_images(output_dir, card_id, followers[card_id], recorder)
+                    success_count += len(followers[card_id])
+        finally:
+            recorder.flush()
+
+    with stage("dedupe"):
+        linked, saved = dedupe_by_content(output_dir, manifest)
+        if linked:
+            save_manifest(manifest_path, manifest)
+            print(f"Deduplicated {linked} identical images by content hash ({saved / 1e6:.1f} MB saved).")
+
+    success_count += linked_count + total_cards - len(plan["download"])
 
     print("-" * 30)
     if len(final_failed_ids) > 0:
@@ -133,3 +404,4 @@ def download_images(cards_json_path, output_dir):
     else:
         print(f"Image download finished successfully! ({success_count}/{total_cards})")
     print("-" * 30)
+    return {"total": total_cards, "succeeded": success_count, "failed": [str(card_id) for card_id in final_failed_ids]}
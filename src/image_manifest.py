@@ -0,0 +1,174 @@
+import os
+import shutil
+import hashlib
+import threading
+from .utils import load_json_or_default, write_json_atomic
+
+MANIFEST_SUFFIX = ".manifest.json"
+IMAGE_SIGNATURES = [b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"RIFF"]
+
+def manifest_path_for(output_dir):
+    # Kept next to output_dir, not inside it, so it never ends up in the image archives.
+    return os.path.normpath(output_dir) + MANIFEST_SUFFIX
+
+def load_manifest(manifest_path):
+    return load_json_or_default(manifest_path, {}, "image manifest")
+
+def save_manifest(manifest_path, manifest):
+    write_json_atomic(manifest_path, manifest, indent=2)
+
+def file_sha256(path):
+    hash_sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+def has_image_signature(path):
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    return any(head.startswith(signature) for signature in IMAGE_SIGNATURES)
+
+def manifest_entry(image_id, size, sha256, etag=None):
+    return {"cardImage": image_id, "size": size, "sha256": sha256, "etag": etag}
+
+class ManifestRecorder:
+    """
+    Thread-safe collector for entries of images saved during a run.
+    Flushes the manifest to disk every flush_every records so an interrupted
+    run keeps what it already downloaded.
+    """
+
+    def __init__(self, manifest_path, manifest, flush_every=500):
+        self.manifest_path = manifest_path
+        self.manifest = manifest
+        self.flush_every = flush_every
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def record(self, card_id, image_id, size, sha256, etag=None):
+        with self.lock:
+            self.manifest[str(card_id)] = manifest_entry(image_id, size, sha256, etag)
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self.flush_locked()
+
+    def flush_locked(self):
+        save_manifest(self.manifest_path, self.manifest)
+        self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+def plan_image_sync(jobs, manifest, output_dir, verify=False):
+    # Diffs the manifest and one listing of output_dir against the wanted jobs. Returns jobs to download and
+    # adopt, files to prune, manifest keys to forget, the unchanged count and counts per reason.
+    with os.scandir(output_dir) as entries:
+        present = {entry.name: entry for entry in entries if entry.is_file()}
+
+    plan = {"download": [], "adopt": [], "prune": [], "forget": [], "unchanged": 0, "reasons": {}}
+
+    def add(kind, job, reason):
+        plan[kind].append(job)
+        plan["reasons"][reason] = plan["reasons"].get(reason, 0) + 1
+
+    wanted = set()
+    for job in jobs:
+        card_id, image_id = job
+        name = f"{card_id}.png"
+        wanted.add(name)
+        entry = manifest.get(str(card_id))
+        dir_entry = present.get(name)
+
+        if entry is None:
+            if dir_entry is None:
+                add("download", job, "new")
+            else:
+                add("adopt", job, "untracked")
+            continue
+
+        if entry.get("cardImage") != image_id:
+            add("download", job, "changed")
+        elif dir_entry is None:
+            add("download", job, "missing")
+        elif dir_entry.stat().st_size != entry.get("size"):
+            add("download", job, "truncated")
+        elif verify and file_sha256(dir_entry.path) != entry.get("sha256"):
+            add("download", job, "damaged")
+        else:
+            plan["unchanged"] += 1
+
+    for name in present:
+        # .part files are leftovers of interrupted downloads.
+        if (name.endswith(".png") and name not in wanted) or name.endswith(".part"):
+            plan["prune"].append(name)
+    plan["forget"] = [card_id for card_id in manifest if f"{card_id}.png" not in wanted]
+    if plan["prune"]:
+        plan["reasons"]["orphaned"] = len(plan["prune"])
+
+    return plan
+
+def apply_local_plan(plan, output_dir, manifest):
+    """
+    Performs the parts of a plan that need no network: adopts untracked files that
+    look like images (others are queued for download) and removes orphans.
+    """
+    for job in plan["adopt"]:
+        card_id, image_id = job
+        path = os.path.join(output_dir, f"{card_id}.png")
+        if has_image_signature(path):
+            manifest[str(card_id)] = manifest_entry(image_id, os.path.getsize(path), file_sha256(path))
+        else:
+            os.remove(path)
+            plan["download"].append(job)
+
+    for name in plan["prune"]:
+        os.remove(os.path.join(output_dir, name))
+
+    for card_id in plan["forget"]:
+        manifest.pop(card_id, None)
+
+def link_or_copy(source_path, target_path):
+    # Hardlink target to source atomically; fall back to a copy where links are unsupported.
+    tmp_path = target_path + ".part"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        shutil.copyfile(source_path, tmp_path)
+    os.replace(tmp_path, target_path)
+
+def dedupe_by_content(output_dir, manifest):
+    """
+    Hardlinks files in output_dir that the manifest says have identical content,
+    so each distinct image is stored once. Returns (files linked, bytes saved).
+    """
+    by_hash = {}
+    for card_id, entry in manifest.items():
+        if entry.get("sha256"):
+            by_hash.setdefault(entry["sha256"], []).append(card_id)
+
+    linked = 0
+    saved = 0
+    for card_ids in by_hash.values():
+        if len(card_ids) < 2:
+            continue
+        card_ids.sort()
+        canonical_path = os.path.join(output_dir, f"{card_ids[0]}.png")
+        if not os.path.exists(canonical_path):
+            continue
+        canonical = os.stat(canonical_path)
+        for card_id in card_ids[1:]:
+            path = os.path.join(output_dir, f"{card_id}.png")
+            if not os.path.exists(path):
+                continue
+            current = os.stat(path)
+            if current.st_ino == canonical.st_ino and current.st_dev == canonical.st_dev:
+                continue
+            link_or_copy(canonical_path, path)
+            linked += 1
+            if current.st_nlink == 1:
+                saved += current.st_size
+    return linked, saved
@@ -0,0 +1,141 @@
+import os
+import concurrent.futures
+from .utils import load_json_or_default, write_json_atomic
+from .instrumentation import note, stage
+from .image_manifest import file_sha256, load_manifest, manifest_path_for
+
+STATE_FILENAME = "postprocess.json"
+
+# format name -> (Pillow format, file extension, save options for full size, save options for thumbnails)
+FORMATS = {
+    "png": ("PNG", "png", {"compress_level": 6}, {"compress_level": 6}),
+    "webp": ("WEBP", "webp", {"lossless": True, "method": 4}, {"quality": 82, "method": 4}),
+    "avif": ("AVIF", "avif", {"quality": 70, "speed": 6}, {"quality": 60, "speed": 6}),
+    "jpg": ("JPEG", "jpg", {"quality": 92, "optimize": True}, {"quality": 85, "optimize": True}),
+}
+
+class PostprocessError(Exception):
+    pass
+
+def parse_variant(spec):
+    """
+    Parses "<format>" or "<format>@<width>" (e.g. "png", "webp@200") into
+    {"name", "format", "width"}; width None keeps the original size.
+    """
+    format_name, _, width = spec.partition("@")
+    format_name = format_name.lower()
+    if format_name not in FORMATS:
+        raise PostprocessError(f"unknown image format '{format_name}' in variant '{spec}'")
+    if width and not width.isdigit():
+        raise PostprocessError(f"invalid width '{width}' in variant '{spec}'")
+    return {
+        "name": f"{format_name}-{width}" if width else format_name,
+        "format": format_name,
+        "width": int(width) if width else None
+    }
+
+def variant_path(out_root, variant, card_id):
+    extension = FORMATS[variant["format"]][1]
+    return os.path.join(out_root, variant["name"], f"{card_id}.{extension}")
+
+def import_pillow():
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise PostprocessError(
+            "image post-processing needs Pillow; install the 'images' extra (uv sync --extra images)"
+        ) from e
+    return Image
+
+def process_image(task):
+    """
+    Process pool worker: decodes one source image once, verifies it and writes every variant.
+    Returns (card_id, error message or None).
+    """
+    card_id, source_path, out_root, variants = task
+    Image = import_pillow()
+    try:
+        with Image.open(source_path) as image:
+            image.load()
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+            for variant in variants:
+                pil_format, _, full_options, thumb_options = FORMATS[variant["format"]]
+                output = image
+                options = full_options
+                if variant["width"] and variant["width"] < image.width:
+                    height = round(image.height * variant["width"] / image.width)
+                    output = image.resize((variant["width"], height), Image.Resampling.LANCZOS)
+                    options = thumb_options
+                if pil_format == "JPEG" and output.mode == "RGBA":
+                    output = output.convert("RGB")
+
+                path = variant_path(out_root, variant, card_id)
+                tmp_path = path + ".part"
+                output.save(tmp_path, format=pil_format, **options)
+                os.replace(tmp_path, path)
+    except Exception as e:
+        return card_id, f"{type(e).__name__}: {e}"
+    return card_id, None
+
+def load_state(state_path):
+    return load_json_or_default(state_path, {}, "post-processing state")
+
+def save_state(state_path, state):
+    write_json_atomic(state_path, state, indent=2)
+
+@stage("postprocess")
+def postprocess_images(source_dir, out_root, variant_specs, workers=None):
+    # Transcodes every <card_id>.png in source_dir into the requested variants under out_root/<variant>/ on a
+    # process pool, skipping images unchanged since the last run. Returns the card ids that failed.
+    variants = [parse_variant(spec) for spec in variant_specs]
+    import_pillow()
+    for variant in variants:
+        os.makedirs(os.path.join(out_root, variant["name"]), exist_ok=True)
+
+    state_path = os.path.join(out_root, STATE_FILENAME)
+    state = load_state(state_path)
+    manifest = load_manifest(manifest_path_for(source_dir))
+    variant_names = sorted(variant["name"] for variant in variants)
+
+    tasks = []
+    source_hashes = {}
+    with os.scandir(source_dir) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file() and entry.name.endswith(".png"))
+    for name in names:
+        card_id = name[:-len(".png")]
+        source_path = os.path.join(source_dir, name)
+        manifest_entry = manifest.get(card_id)
+        source_hash = manifest_entry["sha256"] if manifest_entry else file_sha256(source_path)
+        source_hashes[card_id] = source_hash
+        previous = state.get(card_id)
+        if (previous and previous.get("sha256") == source_hash and previous.get("variants") == variant_names
+                and all(os.path.exists(variant_path(out_root, v, card_id)) for v in variants)):
+            continue
+        tasks.append((card_id, source_path, out_root, variants))
+
+    # Forget cards whose source image is gone.
+    for card_id in list(state):
+        if card_id not in source_hashes:
+            state.pop(card_id)
+
+    print(f"Post-processing {len(tasks)}/{len(names)} images into {', '.join(variant_names)}...")
+    failed_ids = []
+    done = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for card_id, error in executor.map(process_image, tasks, chunksize=16):
+            done += 1
+            if error:
+                failed_ids.append(card_id)
+                state.pop(card_id, None)
+                note("postprocess_error", f"Error post-processing {card_id}: {error}")
+            else:
+                state[card_id] = {"sha256": source_hashes[card_id], "variants": variant_names}
+            if done % 500 == 0:
+                print(f"Post-processed {done}/{len(tasks)} images...", end='\r')
+
+    save_state(state_path, state)
+    print(f"\nPost-processing finished: {len(tasks) - len(failed_ids)} written, "
+          f"{len(names) - len(tasks)} unchanged, {len(failed_ids)} failed.")
+    return failed_ids
@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+from .card_processor import CardDataError, build_card_variants, is_int, is_str, write_cards_json
+from .card_model import as_dict
+from .utils import load_json_or_default, write_json_atomic
+
+# Incremental builds: <name>.state.json fingerprints every json1 record and the inputs it reads, so unchanged
+# records reuse their previous entries; <name>.delta.json lists what changed.
+
+STATE_VERSION = 1
+
+def sidecar_path(output_path, kind):
+    base, _ = os.path.splitext(output_path)
+    return f"{base}.{kind}.json"
+
+def bytes_sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def record_key(card, index):
+    if isinstance(card, dict) and is_int(card.get("id")):
+        return str(card["id"])
+    return f"#{index}"
+
+def referenced_ids(card):
+    # Every id build_card_variants may look up; malformed values are covered by the record itself.
+    ids = [card.get("id")]
+    card_images = card.get("card_images")
+    if isinstance(card_images, list):
+        ids.extend(image.get("id") for image in card_images if isinstance(image, dict))
+    return sorted({card_id for card_id in ids if is_int(card_id)})
+
+def card_fingerprint(card, id_to_data, invalid_json2_ids, limited_lists, typeline_map):
+    """
+    Hashes a json1 record together with the inputs that affect its output:
+    the json2 record (or its validation error) and banlist status of each
+    referenced id, and the translation of its first typeline entry.
+    """
+    inputs = [card]
+    if isinstance(card, dict):
+        for card_id in referenced_ids(card):
+            inputs.append([
+                card_id,
+                id_to_data.get(card_id),
+                invalid_json2_ids.get(card_id),
+                [limited_lists[format_name].get(card_id) for format_name in ["ocg", "tcg", "md"]]
+            ])
+        typeline = card.get("typeline")
+        if isinstance(typeline, list) and typeline and is_str(typeline[0]):
+            inputs.append(typeline_map.get(typeline[0]))
+    payload = json.dumps(inputs, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return bytes_sha256(payload.encode('utf-8'))
+
+class CardCache:
+    """
+    Drop-in for build_card_variants (via build_cards_data(card_cache=...)) that reuses the
+    previous output for json1 records whose fingerprint did not change. Cached data errors
+    are raised again and cached misses return None, so logs and summary counts match a full build.
+    """
+
+    def __init__(self, previous_cards, previous_state):
+        self.previous_cards = previous_cards
+        self.previous_records = previous_state.get("records", {})
+        # Keys that tokens overwrote in the previous output do not hold the built card any more.
+        self.shadowed_keys = set(previous_state.get("token_keys", []))
+        self.records = {}
+        self.reused = 0
+        self.rebuilt = 0
+
+    def reuse(self, previous, fingerprint):
+        if previous is None or previous.get("fingerprint") != fingerprint:
+            return False, None
+        status = previous.get("status")
+        if status == "error":
+            return True, CardDataError(previous["detail"])
+        if status == "not_found":
+            return True, None
+        keys = previous.get("keys", [])
+        if any(key not in self.previous_cards or key in self.shadowed_keys for key in keys):
+            return False, None
+        return True, [(key, self.previous_cards[key]) for key in keys]
+
+    def build(self, card, index, id_to_data, invalid_json2_ids, limited_lists, typeline_map):
+        key = record_key(card, index)
+        if key in self.records:
+            key = f"{key}@{index}"
+        fingerprint = card_fingerprint(card, id_to_data, invalid_json2_ids, limited_lists, typeline_map)
+
+        previous = self.previous_records.get(key)
+        hit, result = self.reuse(previous, fingerprint)
+        if hit:
+            self.reused += 1
+            self.records[key] = previous
+            if isinstance(result, CardDataError):
+                raise result
+            return result
+
+        self.rebuilt += 1
+        try:
+            variants = build_card_variants(card, index, id_to_data, invalid_json2_ids, limited_lists, typeline_map)
+        except CardDataError as e:
+            self.records[key] = {"fingerprint": fingerprint, "status": "error", "detail": str(e)}
+            raise
+        if variants is None:
+            self.records[key] = {"fingerprint": fingerprint, "status": "not_found"}
+        else:
+            self.records[key] = {"fingerprint": fingerprint, "status": "ok", "keys": [k for k, _ in variants]}
+        return variants
+
+def load_previous_build(output_path):
+    """
+    Loads the previous output and its state file.
+    Returns (previous_cards, previous_state, previous_sha256); the state is dropped
+    when it does not describe the output actually on disk.
+    """
+    if not os.path.exists(output_path):
+        return {}, {}, None
+    try:
+        with open(output_path, 'rb') as f:
+            data = f.read()
+        previous_cards = json.loads(data)
+    except Exception as e:
+        print(f"Warning: cannot read previous {output_path}, rebuilding everything: {e}")
+        return {}, {}, None
+    if not isinstance(previous_cards, dict):
+        return {}, {}, None
+    previous_sha256 = bytes_sha256(data)
+
+    previous_state = load_json_or_default(sidecar_path(output_path, "state"), {}, "build state")
+    if (previous_state.get("version") != STATE_VERSION
+            or previous_state.get("output_sha256") != previous_sha256):
+        previous_state = {}
+    return previous_cards, previous_state, previous_sha256
+
+def compute_delta(previous_cards, cards_data):
+    added = {key: as_dict(obj) for key, obj in cards_data.items() if key not in previous_cards}
+    removed = sorted(key for key in previous_cards if key not in cards_data)
+    changed = {
+        key: as_dict(obj) for key, obj in cards_data.items() if key in previous_cards and previous_cards[key] != obj
+    }
+    return added, removed, changed
+
+def write_cards_incremental(cards_data, output_path, card_cache, previous_cards, previous_sha256, token_data=None,
+                            formats=()):
+    """
+    Writes cards.json, its state file and, when a previous output existed, the delta
+    {"from", "to", "added", "removed", "changed"}; from/to are the SHA256 of the old and
+    new cards.json so consumers can check which file a delta applies to.
+    """
+    output_sha256 = write_cards_json(cards_data, output_path, formats)["json"]["sha256"]
+
+    write_json_atomic(sidecar_path(output_path, "state"), {
+        "version": STATE_VERSION,
+        "output_sha256": output_sha256,
+        "token_keys": sorted(token_data) if token_data else [],
+        "records": card_cache.records
+    })
+    print(f"Incremental build: {card_cache.rebuilt} json1 records rebuilt, {card_cache.reused} reused.")
+
+    delta_path = sidecar_path(output_path, "delta")
+    if previous_sha256 is None:
+        if os.path.exists(delta_path):
+            os.remove(delta_path)
+        print("No previous output, delta not written.")
+        return
+
+    added, removed, changed = compute_delta(previous_cards, cards_data)
+    write_json_atomic(delta_path, {
+        "from": previous_sha256,
+        "to": output_sha256,
+        "added": added,
+        "removed": removed,
+        "changed": changed
+    }, indent=2)
+    print(f"Wrote {delta_path}: {len(added)} added, {len(removed)} removed, {len(changed)} changed.")
@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+import contextvars
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; RSS and child CPU are then reported as null.
+    resource = None
+
+# Run-wide metrics, attributed to the innermost active stage and dumped by write_report. Stages live in a
+# context variable, so work started on other threads with the caller's context nests under it.
+
+SAMPLE_LIMIT = 10
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+def new_stage_metrics():
+    return {
+        "calls": 0,
+        "wall_s": 0.0,
+        "cpu_s": 0.0,
+        "children_cpu_s": 0.0,
+        "peak_rss_kb": None,
+        "requests": 0,
+        "statuses": {},
+        "bytes_downloaded": 0,
+        "bytes_written": 0,
+        "latency": {"count": 0, "sum_s": 0.0, "max_s": 0.0, "buckets": {}},
+        "notes": {}
+    }
+
+def rusage_snapshot():
+    if resource is None:
+        return None, None
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS.
+    peak_rss_kb = self_usage.ru_maxrss // 1024 if sys.platform == "darwin" else self_usage.ru_maxrss
+    return peak_rss_kb, children_usage.ru_utime + children_usage.ru_stime
+
+def latency_bucket(seconds):
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+    return "gt_10.0"
+
+class RunMetrics:
+    """
+    Thread-safe collector behind the module-level helpers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.stack = contextvars.ContextVar("stage_stack", default=())
+        self.stages = {}
+        self.notes = {}
+        self.profile_stages = set()
+        self.trace_stages = set()
+        self.profile_dir = "."
+        # Messages are only held back when a run report will keep them.
+        self.reporting = False
+        self.profiles = {}
+        self.memory_traces = {}
+        self.profiling = False
+
+    def current(self):
+        stack = self.stack.get()
+        name = stack[-1] if stack else "other"
+        return self.stages.setdefault(name, new_stage_metrics())
+
+    def record_request(self, status, latency, size=0):
+        with self.lock:
+            metrics = self.current()
+            metrics["requests"] += 1
+            key = str(status) if status is not None else "error"
+            metrics["statuses"][key] = metrics["statuses"].get(key, 0) + 1
+            metrics["bytes_downloaded"] += size
+            histogram = metrics["latency"]
+            histogram["count"] += 1
+            histogram["sum_s"] += latency
+            histogram["max_s"] = max(histogram["max_s"], latency)
+            bucket = latency_bucket(latency)
+            histogram["buckets"][bucket] = histogram["buckets"].get(bucket, 0) + 1
+
+    def add_written(self, size):
+        with self.lock:
+            self.current()["bytes_written"] += size
+
+    def note(self, category, message, limit=SAMPLE_LIMIT):
+        with self.lock:
+            entry = self.notes.setdefault(category, {"count": 0, "samples": []})
+            entry["count"] += 1
+            stage_notes = self.current()["notes"]
+            stage_notes[category] = stage_notes.get(category, 0) + 1
+            sample = entry["count"] <= limit
+            if sample:
+                entry["samples"].append(message)
+            show = sample or not self.reporting
+        if show:
+            print(message)
+        elif entry["count"] == limit + 1:
+            print(f"(further '{category}' messages are counted in the run report, not printed)")
+
+    def matches(self, selected, name):
+        return name in selected or name.rsplit(".", 1)[-1] in selected
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        stack = self.stack.get()
+        full_name = ".".join(stack[-1:] + (name,))
+        token = self.stack.set(stack + (full_name,))
+        with self.lock:
+            metrics = self.current()
+        profiler = self.start_profile(full_name)
+        tracing = self.start_trace(full_name)
+        _, children_before = rusage_snapshot()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield metrics
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            peak_rss_kb, children_after = rusage_snapshot()
+            if tracing:
+                self.stop_trace(full_name)
+            if profiler is not None:
+                self.stop_profile(full_name, profiler)
+            with self.lock:
+                metrics["calls"] += 1
+                metrics["wall_s"] += wall
+                metrics["cpu_s"] += cpu
+                if children_before is not None:
+                    metrics["children_cpu_s"] += children_after - children_before
+                metrics["peak_rss_kb"] = peak_rss_kb
+            self.stack.reset(token)
+
+    def start_profile(self, name):
+        # cProfile cannot nest, so an inner selected stage is covered by the outer profile.
+        if self.profiling or not self.matches(self.profile_stages, name):
+            return None
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            print(f"Warning: cannot profile stage {name}: {e}")
+            return None
+        self.profiling = True
+        return profiler
+
+    def stop_profile(self, name, profiler):
+        profiler.disable()
+        self.profiling = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"profile-{name}.prof")
+        profiler.dump_stats(path)
+        self.profiles[name] = path
+        print(f"Wrote cProfile stats for stage {name} to {path}.")
+
+    def start_trace(self, name):
+        if not self.matches(self.trace_stages, name):
+            return False
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start()
+        return True
+
+    def stop_trace(self, name, top=15):
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.memory_traces[name] = {
+            "peak_bytes": peak,
+            "top": [
+                {"where": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ]
+        }
+
+    def report(self):
+        with self.lock:
+            totals = new_stage_metrics()
+            for metrics in self.stages.values():
+                totals["requests"] += metrics["requests"]
+                totals["bytes_downloaded"] += metrics["bytes_downloaded"]
+                totals["bytes_written"] += metrics["bytes_written"]
+                for status, count in metrics["statuses"].items():
+                    totals["statuses"][status] = totals["statuses"].get(status, 0) + count
+                for bucket, count in metrics["latency"]["buckets"].items():
+                    totals["latency"]["buckets"][bucket] = totals["latency"]["buckets"].get(bucket, 0) + count
+                totals["latency"]["count"] += metrics["latency"]["count"]
+                totals["latency"]["sum_s"] += metrics["latency"]["sum_s"]
+                totals["latency"]["max_s"] = max(totals["latency"]["max_s"], metrics["latency"]["max_s"])
+            peak_rss_kb, children_cpu = rusage_snapshot()
+            totals["calls"] = 1
+            totals["wall_s"] = time.perf_counter() - self.wall_start
+            totals["cpu_s"] = time.process_time() - self.cpu_start
+            totals["children_cpu_s"] = children_cpu
+            totals["peak_rss_kb"] = peak_rss_kb
+            totals["notes"] = {category: entry["count"] for category, entry in self.notes.items()}
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+                "argv": sys.argv,
+                "python": sys.version.split()[0],
+                "totals": totals,
+                "stages": json.loads(json.dumps(self.stages)),
+                "notes": json.loads(json.dumps(self.notes)),
+                "profiles": dict(self.profiles),
+                "memory_traces": dict(self.memory_traces)
+            }
+
+RUN = RunMetrics()
+
+def stage(name):
+    # Context manager or decorator timing a stage (wall, CPU, child CPU, peak RSS); nested stages are named
+    # parent.child, and CPU time is per process, so overlapping stages on other threads count each other.
+    return RUN.stage(name)
+
+def record_request(status, latency, size=0):
+    # status is the HTTP status, or None when no response arrived.
+    RUN.record_request(status, latency, size)
+
+def add_written(size):
+    RUN.add_written(size)
+
+def note(category, message, limit=SAMPLE_LIMIT):
+    # Prints the message. With a run report configured, only the first `limit` of a category
+    # are printed and the rest are counted in the report.
+    RUN.note(category, message, limit)
+
+def configure(profile_stages=(), trace_stages=(), profile_dir=".", reporting=False):
+    # Opt-in diagnostics: cProfile for profile_stages, tracemalloc for trace_stages (full or last dotted name);
+    # reporting=True counts repeated messages in the run report instead of printing them.
+    RUN.reporting = reporting
+    RUN.profile_stages = set(profile_stages or ())
+    RUN.trace_stages = set(trace_stages or ())
+    RUN.profile_dir = profile_dir
+
+def write_report(path):
+    # Local import: utils reports its downloads here.
+    from .utils import write_json_atomic
+
+    report = RUN.report()
+    write_json_atomic(path, report, indent=2)
+    print(f"Wrote run report to {path}.")
+    return report
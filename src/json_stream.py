@@ -0,0 +1,121 @@
+import json
+
+CHUNK_SIZE = 65536
+WHITESPACE = " \t\n\r"
+
+class JsonStreamError(Exception):
+    pass
+
+class JsonStreamReader:
+    """
+    Minimal incremental reader over a text file object.
+    Decodes one JSON value at a time with json.JSONDecoder.raw_decode,
+    keeping only the undecoded tail of the input in memory.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Returns the next non-whitespace character without consuming it, or "" at EOF.
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise JsonStreamError(f"expected '{char}', got '{found or 'EOF'}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self.fill():
+                    continue
+                raise JsonStreamError(str(e)) from e
+            # A number or literal ending exactly at the buffer edge may continue in the next chunk.
+            if end == len(self.buffer) and not self.eof and not isinstance(value, (dict, list, str)):
+                if self.fill():
+                    continue
+            self.pos = end
+            return value
+
+    def object_items(self):
+        # Iterates the members of the object starting at the current position.
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise JsonStreamError(f"expected object key, got {type(key).__name__}")
+            self.expect(":")
+            yield key, self
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise JsonStreamError(f"expected ',' or '}}', got '{separator or 'EOF'}'")
+
+    def array_items(self):
+        # Iterates the elements of the array starting at the current position.
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise JsonStreamError(f"expected ',' or ']', got '{separator or 'EOF'}'")
+
+def iter_object_members(f):
+    """
+    Yields (key, value) for each member of a top-level JSON object.
+    """
+    reader = JsonStreamReader(f)
+    for key, _ in reader.object_items():
+        yield key, reader.value()
+
+def iter_array_field(f, field_name):
+    """
+    Yields the elements of the array stored under field_name in a top-level JSON object.
+    Other members are decoded and discarded. Raises JsonStreamError if the field is not an array.
+    """
+    reader = JsonStreamReader(f)
+    for key, _ in reader.object_items():
+        if key != field_name:
+            reader.value()
+            continue
+        if reader.peek() != "[":
+            raise JsonStreamError(f"field '{field_name}' expected list")
+        yield from reader.array_items()
@@ -0,0 +1,149 @@
+import os
+import tarfile
+import hashlib
+import concurrent.futures
+from .utils import load_json_or_default, write_json_atomic
+from .image_manifest import load_manifest, manifest_path_for
+
+SHARD_SIZE = 10000
+XZ_PRESET = 6
+INDEX_FILENAME = "card-images-index.json"
+
+class HashingWriter:
+    """
+    Write-only file wrapper that hashes everything written through it.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+def shard_name(index):
+    return f"card-images-{index}.tar.xz"
+
+def normalized_tarinfo(name, size, linkname=None):
+    # Fixed metadata so identical inputs always produce identical archives.
+    info = tarfile.TarInfo(name)
+    info.mtime = 0
+    info.uid = 0
+    info.gid = 0
+    info.uname = ""
+    info.gname = ""
+    info.mode = 0o644
+    if linkname is None:
+        info.size = size
+    else:
+        info.type = tarfile.LNKTYPE
+        info.linkname = linkname
+    return info
+
+def build_shard(task):
+    """
+    Process pool worker: writes one reproducible .tar.xz shard and its .sha256 file.
+    Returns (shard name, archive SHA256).
+    """
+    source_dir, names, output_path = task
+    tmp_path = output_path + ".part"
+    seen_inodes = {}
+    with open(tmp_path, 'wb') as raw:
+        writer = HashingWriter(raw)
+        with tarfile.open(fileobj=writer, mode="w:xz", preset=XZ_PRESET, format=tarfile.GNU_FORMAT) as tar:
+            for name in names:
+                path = os.path.join(source_dir, name)
+                stat = os.stat(path)
+                inode = (stat.st_dev, stat.st_ino)
+                if stat.st_nlink > 1 and inode in seen_inodes:
+                    tar.addfile(normalized_tarinfo(name, 0, seen_inodes[inode]))
+                    continue
+                seen_inodes[inode] = name
+                with open(path, 'rb') as f:
+                    tar.addfile(normalized_tarinfo(name, stat.st_size), f)
+        digest = writer.hash.hexdigest()
+    os.replace(tmp_path, output_path)
+
+    archive_name = os.path.basename(output_path)
+    with open(output_path + ".sha256", 'w', encoding='utf-8') as f:
+        f.write(f"{digest}  {archive_name}\n")
+    return archive_name, digest
+
+def shard_fingerprint(names, manifest):
+    # Content fingerprint from the image manifest, so unchanged shards are detected without reading images.
+    hash_fp = hashlib.sha256()
+    for name in names:
+        entry = manifest.get(name[:-len(".png")]) if name.endswith(".png") else None
+        if entry is None or not entry.get("sha256"):
+            return None
+        hash_fp.update(f"{name}\0{entry['sha256']}\n".encode('utf-8'))
+    return hash_fp.hexdigest()
+
+def pack_images(source_dir, output_dir, shard_size=SHARD_SIZE, workers=None):
+    # Packs source_dir into byte-reproducible card-images-N.tar.xz shards with .sha256 files and an index of
+    # card id -> shard, rebuilding only shards whose content changed. Returns the index.
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    names = []
+    if os.path.isdir(source_dir):
+        with os.scandir(source_dir) as entries:
+            names = sorted(entry.name for entry in entries if entry.is_file() and not entry.name.endswith(".part"))
+    if not names:
+        print(f"Warning: {source_dir} is empty or missing.")
+        return None
+
+    manifest = load_manifest(manifest_path_for(source_dir))
+    index_path = os.path.join(output_dir, INDEX_FILENAME)
+    previous = {shard["name"]: shard for shard in load_json_or_default(index_path, {}).get("shards", [])}
+
+    shards = []
+    tasks = []
+    for shard_index, start in enumerate(range(0, len(names), shard_size)):
+        shard_names = names[start:start + shard_size]
+        name = shard_name(shard_index)
+        output_path = os.path.join(output_dir, name)
+        fingerprint = shard_fingerprint(shard_names, manifest)
+        shard = {"name": name, "files": len(shard_names), "fingerprint": fingerprint, "sha256": None}
+        old = previous.get(name)
+        if (fingerprint and old and old.get("fingerprint") == fingerprint
+                and os.path.exists(output_path) and os.path.exists(output_path + ".sha256")):
+            shard["sha256"] = old["sha256"]
+            print(f"Reusing unchanged {name}.")
+        else:
+            tasks.append((source_dir, shard_names, output_path))
+        shards.append((shard, shard_names))
+
+    print(f"Compressing {len(tasks)}/{len(shards)} shards...")
+    digests = {}
+    if tasks:
+        max_workers = workers or min(len(tasks), os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for archive_name, digest in executor.map(build_shard, tasks):
+                digests[archive_name] = digest
+                print(f"Created {archive_name} ({digest[:12]}).")
+
+    index = {"shard_size": shard_size, "shards": [], "cards": {}}
+    for shard_index, (shard, shard_names) in enumerate(shards):
+        if shard["sha256"] is None:
+            shard["sha256"] = digests[shard["name"]]
+        index["shards"].append(shard)
+        for name in shard_names:
+            card_id, _ = os.path.splitext(name)
+            index["cards"][card_id] = shard_index
+
+    # Shards of a previous, larger pack must not be published next to the new index.
+    current = {shard["name"] for shard in index["shards"]}
+    for name in sorted(set(previous) - current):
+        for path in [os.path.join(output_dir, name), os.path.join(output_dir, name + ".sha256")]:
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"Removed stale {name}.")
+
+    write_json_atomic(index_path, index, indent=2)
+    print(f"Wrote shard index {index_path}.")
+    return index
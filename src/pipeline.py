@@ -0,0 +1,236 @@
+import io
+import os
+import json
+import time
+import hashlib
+import zipfile
+import contextlib
+import requests
+from .utils import FileSink, HashingReader, verify_md5, verify_sha256
+from .cache import cached_download, get_derived, record_derived
+from .instrumentation import record_request, stage
+from .json_stream import JsonStreamError, iter_array_field, iter_object_members
+from .resources import (
+    TOKEN_URL, TOKEN_SHA256_URL, LIMITED_URL, LIMITED_SHA256_URL, TYPELINE_URL, TYPELINE_SHA256_URL,
+    fetch_verified_cached, parse_limited_tarball
+)
+from .resource_files import empty_limited_list, parse_typeline_lines
+from .data_manager import JSON1_URL, JSON2_ZIP_URL, JSON2_MD5_URL
+from .card_processor import build_cards_data, load_json2_lookup, print_summary, write_cards_json
+from .incremental import CardCache, load_previous_build, write_cards_incremental
+from .sqlite_export import export_cards_sqlite
+from .scheduler import TaskGraph
+
+# In-memory pipeline: stages hand parsed objects on and write intermediates only to keep_dir (res/ and tmp/
+# layout); independent downloads run on a TaskGraph.
+
+def keep_path(keep_dir, name):
+    path = os.path.join(keep_dir, name)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    return path
+
+def keep_bytes(keep_dir, name, data):
+    with open(keep_path(keep_dir, name), 'wb') as f:
+        f.write(data)
+
+def fetch_verified_bytes(url, sha256_url, cache_dir=None):
+    # Returns (data, verified) for a small resource, hashing the bytes already in memory.
+    if cache_dir:
+        cached_path, _, _, verified = fetch_verified_cached(url, sha256_url, None, cache_dir)
+        with open(cached_path, 'rb') as f:
+            return f.read(), verified
+
+    print(f"Downloading {url}...")
+    request_start = time.perf_counter()
+    response = requests.get(url, timeout=60)
+    record_request(response.status_code, time.perf_counter() - request_start, len(response.content))
+    response.raise_for_status()
+    data = response.content
+    return data, verify_sha256(url, sha256_url, hashlib.sha256(data).hexdigest())
+
+def load_resources_stage(cache_dir=None, keep_dir=None):
+    """
+    Fetches token.json, the banlist tarball and typeline.conf into memory, all three
+    (and their checksums) concurrently.
+    Returns {"token": dict or None, "limited": limited lists, "typeline": typeline map}.
+    """
+    graph = TaskGraph()
+    graph.add("token", lambda: fetch_verified_bytes(TOKEN_URL, TOKEN_SHA256_URL, cache_dir))
+    graph.add("limited", lambda: fetch_verified_bytes(LIMITED_URL, LIMITED_SHA256_URL, cache_dir))
+    graph.add("typeline", lambda: fetch_verified_bytes(TYPELINE_URL, TYPELINE_SHA256_URL, cache_dir))
+    fetched = graph.run()
+
+    token_bytes, verified = fetched["token"]
+    if not verified:
+        print("Warning: token.json verification failed.")
+    token_data = None
+    try:
+        token_data = json.loads(token_bytes)
+    except Exception as e:
+        print(f"Error merging token.json: {e}")
+
+    limited_bytes, verified = fetched["limited"]
+    limited_members = {}
+    if verified:
+        limited_lists, limited_members = parse_limited_tarball(limited_bytes)
+    else:
+        print("Warning: forbidden_and_limited_list.tar.xz verification failed.")
+        limited_lists = empty_limited_list()
+
+    typeline_bytes, verified = fetched["typeline"]
+    if not verified:
+        print("Warning: typeline.conf verification failed.")
+    typeline_map = parse_typeline_lines(typeline_bytes.decode('utf-8').splitlines())
+
+    if keep_dir:
+        keep_bytes(keep_dir, "token.json", token_bytes)
+        keep_bytes(keep_dir, "typeline.conf", typeline_bytes)
+        for name, raw in limited_members.items():
+            keep_bytes(keep_dir, os.path.join("limited", name), raw)
+
+    return {"token": token_data, "limited": limited_lists, "typeline": typeline_map}
+
+def load_json2_stage(cache_dir=None, keep_dir=None):
+    """
+    Parses cards.json straight out of cards.zip into the compact json2 lookup,
+    hashing the member while it is decompressed. Returns None if it cannot be verified.
+    """
+    entry = None
+    modified = True
+    if cache_dir:
+        zip_source, entry, modified = cached_download(JSON2_ZIP_URL, cache_dir)
+    else:
+        print(f"Downloading {JSON2_ZIP_URL}...")
+        request_start = time.perf_counter()
+        response = requests.get(JSON2_ZIP_URL, timeout=60)
+        record_request(response.status_code, time.perf_counter() - request_start, len(response.content))
+        response.raise_for_status()
+        zip_source = io.BytesIO(response.content)
+
+    print("Loading json2 (cards.json) for name and description lookup...")
+    hash_md5 = hashlib.md5()
+    try:
+        with contextlib.ExitStack() as stack:
+            sinks = [hash_md5]
+            if keep_dir:
+                sinks.append(FileSink(stack.enter_context(open(keep_path(keep_dir, "json2.json"), 'wb'))))
+            zip_ref = stack.enter_context(zipfile.ZipFile(zip_source, 'r'))
+            member = stack.enter_context(zip_ref.open("cards.json"))
+            reader = HashingReader(member, *sinks)
+            text = io.TextIOWrapper(io.BufferedReader(reader), encoding='utf-8')
+            json2_lookup = load_json2_lookup(iter_object_members(text))
+            reader.drain()
+    except KeyError:
+        print("Expected cards.json not found in cards.zip.")
+        return None
+    except (OSError, zipfile.BadZipFile, JsonStreamError) as e:
+        print(f"Error loading json2.json: {e}")
+        return None
+
+    if not modified and get_derived(entry, "md5_verified") is True:
+        verified = True
+    else:
+        verified = verify_md5("cards.json", JSON2_MD5_URL, hash_md5.hexdigest())
+        if cache_dir:
+            record_derived(cache_dir, JSON2_ZIP_URL, "md5_verified", verified)
+    if not verified:
+        print("MD5 verification failed for the extracted file.")
+        return None
+
+    print(f"Loaded {len(json2_lookup[0])} cards from json2.json.")
+    return json2_lookup
+
+def fetch_json1_stage(cache_dir):
+    # Refreshes the cached json1 body; returns its path.
+    cached_path, _, _ = cached_download(JSON1_URL, cache_dir)
+    return cached_path
+
+def iter_json1_stage(cache_dir=None, keep_dir=None, cached_path=None):
+    """
+    Yields json1 cards one at a time, streamed from the cache (fetched here unless
+    cached_path is given) or straight from the response.
+    """
+    with contextlib.ExitStack() as stack:
+        if cache_dir:
+            if cached_path is None:
+                cached_path = fetch_json1_stage(cache_dir)
+            raw = stack.enter_context(open(cached_path, 'rb'))
+        else:
+            print(f"Streaming {JSON1_URL}...")
+            request_start = time.perf_counter()
+            response = stack.enter_context(requests.get(JSON1_URL, stream=True, timeout=60))
+            response.raise_for_status()
+            response.raw.decode_content = True
+            raw = response.raw
+
+        reader = None
+        if keep_dir:
+            kept = stack.enter_context(open(keep_path(keep_dir, "json1.json"), 'wb'))
+            raw = reader = HashingReader(raw, FileSink(kept))
+
+        text = io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8')
+        yield from iter_array_field(text, "data")
+        if reader is not None:
+            reader.drain()
+        if not cache_dir:
+            record_request(response.status_code, time.perf_counter() - request_start, response.raw.tell())
+
+def run_pipeline(output_path, cache_dir=None, keep_dir=None, incremental=False, sqlite_path=None, workers=None,
+                 on_card=None, formats=()):
+    # Fetches every source concurrently and builds cards.json at output_path without tmp/ or res/ round-trips.
+    # Returns the cards mapping, or None on failure.
+    if keep_dir and not os.path.exists(keep_dir):
+        os.makedirs(keep_dir)
+
+    def timed(name, func, *args):
+        def task():
+            with stage(name):
+                return func(*args)
+        return task
+
+    graph = TaskGraph()
+    graph.add("resources", timed("resources", load_resources_stage, cache_dir, keep_dir))
+    graph.add("json2", timed("json2", load_json2_stage, cache_dir, keep_dir))
+    if cache_dir:
+        graph.add("json1", timed("json1", fetch_json1_stage, cache_dir))
+    try:
+        fetched = graph.run()
+    except (OSError, requests.RequestException) as e:
+        print(f"Error fetching sources: {e}")
+        return None
+    resources = fetched["resources"]
+    json2_lookup = fetched["json2"]
+    if json2_lookup is None:
+        print("json2 is unavailable, cannot generate cards.json.")
+        return None
+
+    card_cache = None
+    if incremental:
+        previous_cards, previous_state, previous_sha256 = load_previous_build(output_path)
+        card_cache = CardCache(previous_cards, previous_state)
+
+    print("Generating cards.json from json1...")
+    try:
+        # Without a cache json1 is streamed while it is built, so its download is part of this stage.
+        with stage("build"):
+            cards_data, summary = build_cards_data(
+                iter_json1_stage(cache_dir, keep_dir, fetched.get("json1")), json2_lookup,
+                resources["limited"], resources["typeline"], resources["token"],
+                card_cache=card_cache, workers=workers, on_card=on_card
+            )
+    except (OSError, requests.RequestException, JsonStreamError) as e:
+        print(f"Error loading json1.json: {e}")
+        return None
+
+    with stage("write"):
+        if incremental:
+            write_cards_incremental(
+                cards_data, output_path, card_cache, previous_cards, previous_sha256, resources["token"], formats
+            )
+        else:
+            write_cards_json(cards_data, output_path, formats)
+        if sqlite_path:
+            export_cards_sqlite(sorted(cards_data.items()), sqlite_path)
+    print_summary(**summary)
+    return cards_data
@@ -0,0 +1,58 @@
+import os
+import json
+
+# Readers for the resource files under res/ and their in-memory forms. Kept apart from
+# resources.py, which fetches them, so an offline build never imports the network stack.
+
+def parse_typeline_lines(lines):
+    mapping = {}
+    for line in lines:
+        line = line.strip()
+        if line and "=" in line:
+            key, value = line.split("=", 1)
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+def load_typeline_conf(res_dir):
+    conf_path = os.path.join(res_dir, "typeline.conf")
+    mapping = {}
+    if os.path.exists(conf_path):
+        with open(conf_path, 'r', encoding='utf-8') as f:
+            mapping = parse_typeline_lines(f)
+    return mapping
+
+def empty_limited_list():
+    return {
+        "ocg": {},
+        "tcg": {},
+        "md": {}
+    }
+
+def merge_limited_format(limited_data, format_name, data):
+    # Flatten the structure: id -> status
+    # data structure is {"forbidden": [ids], "limited": [ids], "semi-limited": [ids]}
+    for status, ids in data.items():
+        for card_id in ids:
+            limited_data[format_name][card_id] = status
+
+def load_limited_list(res_dir):
+    limited_data = empty_limited_list()
+
+    limited_dir = os.path.join(res_dir, "limited")
+    if not os.path.exists(limited_dir):
+        print(f"Warning: Limited list directory {limited_dir} not found.")
+        return limited_data
+
+    for format_name in ["ocg", "tcg", "md"]:
+        file_path = os.path.join(limited_dir, f"{format_name}.json")
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    merge_limited_format(limited_data, format_name, json.load(f))
+                print(f"Loaded {format_name} limited list.")
+            except Exception as e:
+                print(f"Error loading {format_name} limited list: {e}")
+        else:
+            print(f"Warning: {format_name}.json not found in {limited_dir}")
+
+    return limited_data
@@ -1,91 +1,150 @@
+import io
 import os
+import shutil
+import hashlib
 import tarfile
 import json
-from .utils import download_file, verify_sha256
+import time
+import requests
+from .utils import HashingReader, download_file, verify_sha256
+from .cache import cached_download, derived_dir_for, get_derived, link_cached, load_cache_index, record_derived
+from .instrumentation import record_request, stage
+from .resource_files import empty_limited_list, merge_limited_format
 
-def download_resources(res_dir):
+TOKEN_URL = "https://github.com/Arshtyi/YuGiOh-Tokens/releases/download/latest/token.json"
+TOKEN_SHA256_URL = "https://github.com/Arshtyi/YuGiOh-Tokens/releases/download/latest/token.json.sha256"
+LIMITED_URL = "https://github.com/Arshtyi/YuGiOh-Forbidden-And-Limited-List/releases/download/latest/forbidden_and_limited_list.tar.xz"
+LIMITED_SHA256_URL = "https://github.com/Arshtyi/YuGiOh-Forbidden-And-Limited-List/releases/download/latest/forbidden_and_limited_list.tar.xz.sha256"
+TYPELINE_URL = "https://github.com/Arshtyi/Translations-Of-YuGiOh-Cards-Type/releases/download/latest/typeline.conf"
+TYPELINE_SHA256_URL = "https://github.com/Arshtyi/Translations-Of-YuGiOh-Cards-Type/releases/download/latest/typeline.conf.sha256"
+
+def fetch_verified_cached(url, sha256_url, filepath, cache_dir):
+    # Returns (cached_path, entry, modified, verified); skips the checksum fetch on a 304.
+    cached_path, entry, modified = cached_download(url, cache_dir)
+    verified = get_derived(entry, "sha256_verified") is True
+    if modified or not verified:
+        verified = verify_sha256(cached_path, sha256_url, entry["sha256"])
+        record_derived(cache_dir, url, "sha256_verified", verified)
+    if filepath is not None:
+        link_cached(cached_path, filepath)
+    return cached_path, entry, modified, verified
+
+def extract_limited_list_cached(limited_url, cached_path, cache_dir, limited_extract_dir):
+    # The extracted tree is kept next to the cached tarball and reused until the tarball changes.
+    derived_dir = derived_dir_for(cache_dir, limited_url)
+    entry = load_cache_index(cache_dir).get(limited_url)
+    if get_derived(entry, "extracted") is not True:
+        print("Extracting forbidden_and_limited_list.tar.xz...")
+        with tarfile.open(cached_path, "r:xz") as tar:
+            tar.extractall(path=derived_dir, filter="data")
+        record_derived(cache_dir, limited_url, "extracted", True)
+        print("Extraction complete.")
+    else:
+        print("Reusing cached forbidden_and_limited_list extraction.")
+
+    if os.path.exists(limited_extract_dir):
+        shutil.rmtree(limited_extract_dir)
+    shutil.copytree(derived_dir, limited_extract_dir)
+
+def extract_tar_stream_verified(url, sha256_url, extract_dir):
+    """
+    Streams a .tar.xz from url straight into tarfile, hashing it on the way,
+    and moves the extracted tree into extract_dir only if the SHA256 matches.
+    """
+    print(f"Streaming {url} into {extract_dir}...")
+    staging_dir = extract_dir + ".part"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+
+    hash_sha256 = hashlib.sha256()
+    request_start = time.perf_counter()
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        reader = HashingReader(response.raw, hash_sha256)
+        with tarfile.open(fileobj=reader, mode="r|xz") as tar:
+            tar.extractall(path=staging_dir, filter="data")
+        reader.drain()
+        record_request(response.status_code, time.perf_counter() - request_start, response.raw.tell())
+
+    if not verify_sha256(url, sha256_url, hash_sha256.hexdigest()):
+        shutil.rmtree(staging_dir)
+        return False
+
+    if os.path.exists(extract_dir):
+        shutil.rmtree(extract_dir)
+    os.replace(staging_dir, extract_dir)
+    print("Extraction complete.")
+    return True
+
+@stage("resources")
+def download_resources(res_dir, cache_dir=None):
     if not os.path.exists(res_dir):
         os.makedirs(res_dir)
 
     # 1. token.json
-    token_url = "https://github.com/Arshtyi/YuGiOh-Tokens/releases/download/latest/token.json"
-    token_sha256_url = "https://github.com/Arshtyi/YuGiOh-Tokens/releases/download/latest/token.json.sha256"
+    token_url = TOKEN_URL
+    token_sha256_url = TOKEN_SHA256_URL
     token_path = os.path.join(res_dir, "token.json")
 
-    download_file(token_url, token_path)
-    if not verify_sha256(token_path, token_sha256_url):
+    if cache_dir:
+        _, _, _, verified = fetch_verified_cached(token_url, token_sha256_url, token_path, cache_dir)
+    else:
+        result = download_file(token_url, token_path)
+        verified = verify_sha256(token_path, token_sha256_url, result["sha256"])
+    if not verified:
         print("Warning: token.json verification failed.")
 
     # 2. forbidden_and_limited_list.tar.xz
-    limited_url = "https://github.com/Arshtyi/YuGiOh-Forbidden-And-Limited-List/releases/download/latest/forbidden_and_limited_list.tar.xz"
-    limited_sha256_url = "https://github.com/Arshtyi/YuGiOh-Forbidden-And-Limited-List/releases/download/latest/forbidden_and_limited_list.tar.xz.sha256"
-    limited_path = os.path.join(res_dir, "forbidden_and_limited_list.tar.xz")
+    limited_url = LIMITED_URL
+    limited_sha256_url = LIMITED_SHA256_URL
     limited_extract_dir = os.path.join(res_dir, "limited")
 
-    download_file(limited_url, limited_path)
-    if verify_sha256(limited_path, limited_sha256_url):
-        print("Extracting forbidden_and_limited_list.tar.xz...")
-        if not os.path.exists(limited_extract_dir):
-            os.makedirs(limited_extract_dir)
-        with tarfile.open(limited_path, "r:xz") as tar:
-            tar.extractall(path=limited_extract_dir)
-        print("Extraction complete.")
-
-        # Clean up tar.xz file
-        if os.path.exists(limited_path):
-            os.remove(limited_path)
-            print(f"Removed {limited_path}")
+    if cache_dir:
+        cached_path, _, _, verified = fetch_verified_cached(limited_url, limited_sha256_url, None, cache_dir)
+        if verified:
+            extract_limited_list_cached(limited_url, cached_path, cache_dir, limited_extract_dir)
+        else:
+            print("Warning: forbidden_and_limited_list.tar.xz verification failed.")
     else:
-        print("Warning: forbidden_and_limited_list.tar.xz verification failed.")
+        if not extract_tar_stream_verified(limited_url, limited_sha256_url, limited_extract_dir):
+            print("Warning: forbidden_and_limited_list.tar.xz verification failed.")
 
     # 3. typeline.conf
-    typeline_url = "https://github.com/Arshtyi/Translations-Of-YuGiOh-Cards-Type/releases/download/latest/typeline.conf"
-    typeline_sha256_url = "https://github.com/Arshtyi/Translations-Of-YuGiOh-Cards-Type/releases/download/latest/typeline.conf.sha256"
+    typeline_url = TYPELINE_URL
+    typeline_sha256_url = TYPELINE_SHA256_URL
     typeline_path = os.path.join(res_dir, "typeline.conf")
 
-    download_file(typeline_url, typeline_path)
-    if not verify_sha256(typeline_path, typeline_sha256_url):
+    if cache_dir:
+        _, _, _, verified = fetch_verified_cached(typeline_url, typeline_sha256_url, typeline_path, cache_dir)
+    else:
+        result = download_file(typeline_url, typeline_path)
+        verified = verify_sha256(typeline_path, typeline_sha256_url, result["sha256"])
+    if not verified:
         print("Warning: typeline.conf verification failed.")
 
-def load_typeline_conf(res_dir):
-    conf_path = os.path.join(res_dir, "typeline.conf")
-    mapping = {}
-    if os.path.exists(conf_path):
-        with open(conf_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and "=" in line:
-                    key, value = line.split("=", 1)
-                    mapping[key.strip()] = value.strip()
-    return mapping
-
-def load_limited_list(res_dir):
-    limited_data = {
-        "ocg": {},
-        "tcg": {},
-        "md": {}
-    }
-
-    limited_dir = os.path.join(res_dir, "limited")
-    if not os.path.exists(limited_dir):
-        print(f"Warning: Limited list directory {limited_dir} not found.")
-        return limited_data
+def parse_limited_tarball(data):
+    """
+    Reads ocg/tcg/md.json straight out of an in-memory forbidden_and_limited_list.tar.xz.
+    Returns (limited_data, members) where members maps file name -> raw bytes.
+    """
+    limited_data = empty_limited_list()
+    members = {}
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:xz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = os.path.basename(member.name)
+            members[name] = tar.extractfile(member).read()
 
     for format_name in ["ocg", "tcg", "md"]:
-        file_path = os.path.join(limited_dir, f"{format_name}.json")
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # Flatten the structure: id -> status
-                    # data structure is {"forbidden": [ids], "limited": [ids], "semi-limited": [ids]}
-                    for status, ids in data.items():
-                        for card_id in ids:
-                            limited_data[format_name][card_id] = status
-                print(f"Loaded {format_name} limited list.")
-            except Exception as e:
-                print(f"Error loading {format_name} limited list: {e}")
-        else:
-            print(f"Warning: {format_name}.json not found in {limited_dir}")
-
-    return limited_data
+        raw = members.get(f"{format_name}.json")
+        if raw is None:
+            print(f"Warning: {format_name}.json not found in limited list archive")
+            continue
+        try:
+            merge_limited_format(limited_data, format_name, json.loads(raw))
+            print(f"Loaded {format_name} limited list.")
+        except Exception as e:
+            print(f"Error loading {format_name} limited list: {e}")
+    return limited_data, members
@@ -0,0 +1,58 @@
+import contextvars
+import concurrent.futures
+
+# Minimal dependency-graph runner: every task starts on a thread as soon as the tasks
+# it depends on have finished, so independent network fetches overlap and the run
+# takes about as long as its longest chain of dependencies.
+
+class TaskGraph:
+    """
+    graph.add("json2", load_json2)
+    graph.add("build", build, "json2", "resources")   # build(json2_result, resources_result)
+    results = graph.run()
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.tasks = {}
+
+    def add(self, name, func, *deps):
+        # func is called with the results of deps, in the order given.
+        if name in self.tasks:
+            raise ValueError(f"task '{name}' added twice")
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"task '{name}' depends on unknown task '{dep}'")
+        self.tasks[name] = (func, deps)
+
+    def run(self):
+        # Runs every task in the caller's context and returns {name: result}; if a task raises, its dependents are
+        # skipped, running tasks are awaited and the first exception is re-raised.
+        results = {}
+        failed = None
+        pending = dict(self.tasks)
+        running = {}
+        workers = self.max_workers or max(1, len(self.tasks))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                if failed is None:
+                    for name, (func, deps) in list(pending.items()):
+                        if all(dep in results for dep in deps):
+                            del pending[name]
+                            context = contextvars.copy_context()
+                            args = [results[dep] for dep in deps]
+                            running[executor.submit(context.run, func, *args)] = name
+                elif not running:
+                    break
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except BaseException as e:
+                        if failed is None:
+                            failed = e
+        if failed is not None:
+            raise failed
+        return results
@@ -0,0 +1,123 @@
+import os
+import hashlib
+from .utils import load_json_or_default, write_json_atomic
+from .card_store import CardStore
+from .image_manifest import (
+    dedupe_by_content, file_sha256, link_or_copy, load_manifest, manifest_path_for, plan_image_sync, save_manifest
+)
+
+# Sharded cold refills: cards are split by a hash of their cardImage; each node runs
+# "main.py images --shard k/N" and "main.py merge shards/fig-*-of-N --retry" combines them into fig/.
+
+SHARDS_DIR = "shards"
+REPORT_SUFFIX = ".shard.json"
+FAILURES_SUFFIX = ".failures.json"
+
+def parse_shard(text):
+    # "i/N" -> (i, N) with 0 <= i < N; raises ValueError otherwise.
+    index, _, count = text.partition("/")
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard {text} is not of the form i/N with 0 <= i < N")
+    return index, count
+
+def shard_of(image_id, count):
+    # Stable across machines and Python runs, unlike hash().
+    digest = hashlib.sha256(str(image_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+def shard_jobs(jobs, index, count):
+    return [job for job in jobs if shard_of(job[1], count) == index]
+
+def shard_dir_for(index, count, root=SHARDS_DIR):
+    return os.path.join(root, f"fig-{index}-of-{count}")
+
+def download_shard(cards_json_path, index, count, root=SHARDS_DIR, **download_options):
+    # Syncs shard index of count into its own directory and writes its report (shard, cards.json SHA256, failed
+    # ids). Returns the report, or None if cards_json_path does not exist.
+    from .image_manager import download_images
+
+    shard_dir = shard_dir_for(index, count, root)
+    os.makedirs(root, exist_ok=True)
+    result = download_images(cards_json_path, shard_dir, shard=(index, count), **download_options)
+    if result is None:
+        return None
+    report = {
+        "shard": index,
+        "count": count,
+        "cards_sha256": file_sha256(cards_json_path),
+        "cards": result["total"],
+        "failed": sorted(result["failed"]),
+    }
+    write_json_atomic(shard_dir + REPORT_SUFFIX, report, indent=2)
+    return report
+
+def load_shard_report(shard_dir):
+    path = os.path.normpath(shard_dir) + REPORT_SUFFIX
+    report = load_json_or_default(path, {}, "shard report")
+    if not report:
+        print(f"Warning: skipping {shard_dir}: no readable shard report {path}.")
+        return None
+    return report
+
+def merge_shards(shard_dirs, output_dir, cards_json_path, retry=False, **download_options):
+    # Links the matching shards into output_dir in shard order, merges their manifests and lists missing cards
+    # in <output_dir>.failures.json (retry=True fetches them first). Returns that report, or None.
+    if not os.path.exists(cards_json_path):
+        print(f"Error: {cards_json_path} not found.")
+        return None
+    cards_sha256 = file_sha256(cards_json_path)
+    with CardStore(cards_json_path) as store:
+        wanted = dict(store.image_jobs())
+
+    shards = {}
+    counts = set()
+    for shard_dir in sorted(shard_dirs):
+        report = load_shard_report(shard_dir)
+        if report is None:
+            continue
+        if report.get("cards_sha256") != cards_sha256:
+            print(f"Warning: skipping {shard_dir}: it was downloaded for a different {cards_json_path}.")
+            continue
+        if report["shard"] in shards:
+            print(f"Warning: skipping {shard_dir}: shard {report['shard']} already comes from "
+                  f"{shards[report['shard']]}.")
+            continue
+        shards[report["shard"]] = shard_dir
+        counts.add(report["count"])
+    if len(counts) > 1:
+        print(f"Warning: shard directories come from different shard counts {sorted(counts)}.")
+    missing_shards = sorted(set(range(max(counts))) - set(shards)) if counts else []
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path_for(output_dir)
+    manifest = load_manifest(manifest_path)
+    merged = 0
+    for shard in sorted(shards):
+        shard_dir = shards[shard]
+        for card_id, entry in sorted(load_manifest(manifest_path_for(shard_dir)).items()):
+            source_path = os.path.join(shard_dir, f"{card_id}.png")
+            if wanted.get(card_id) != entry.get("cardImage") or not os.path.isfile(source_path) \
+                    or os.path.getsize(source_path) != entry.get("size"):
+                continue
+            link_or_copy(source_path, os.path.join(output_dir, f"{card_id}.png"))
+            manifest[card_id] = entry
+            merged += 1
+    # Shards cannot see each other's files, so equal images from different shards are linked here.
+    dedupe_by_content(output_dir, manifest)
+    save_manifest(manifest_path, manifest)
+    print(f"Merged {merged} images from {len(shards)} shards into {output_dir}.")
+
+    plan = plan_image_sync(list(wanted.items()), manifest, output_dir)
+    failed = sorted(str(card_id) for card_id, _ in plan["download"])
+    if retry and failed:
+        print(f"Re-queueing {len(failed)} cards that no shard delivered...")
+        from .image_manager import download_images
+        failed = sorted(download_images(cards_json_path, output_dir, **download_options)["failed"])
+
+    report = {"cards_sha256": cards_sha256, "merged": merged, "missing_shards": missing_shards, "failed": failed}
+    write_json_atomic(os.path.normpath(output_dir) + FAILURES_SUFFIX, report, indent=2)
+    if missing_shards:
+        print(f"Missing shards: {missing_shards}.")
+    print(f"{len(failed)} cards still without an image (see {os.path.normpath(output_dir) + FAILURES_SUFFIX}).")
+    return report
@@ -0,0 +1,111 @@
+import os
+import json
+import sqlite3
+from .instrumentation import add_written
+from .card_model import as_dict
+
+# Indexed SQLite companion of cards.json. Every cards.json field has its own column
+# (NULL where the JSON omits the key), the limit object is split into one column per
+# format, and the exact JSON object is kept in "json" so nothing is lost.
+
+SCHEMA_VERSION = 1
+
+# (cards.json field, column name, SQL type)
+CARD_COLUMNS = [
+    ("id", "id", "INTEGER"),
+    ("uniqueId", "uniqueId", "INTEGER"),
+    ("cardImage", "cardImage", "INTEGER"),
+    ("name", "name", "TEXT"),
+    ("description", "description", "TEXT"),
+    ("pendulumDescription", "pendulumDescription", "TEXT"),
+    ("cardType", "cardType", "TEXT"),
+    ("attribute", "attribute", "TEXT"),
+    ("race", "race", "TEXT"),
+    ("frameType", "frameType", "TEXT"),
+    ("typeline", "typeline", "TEXT"),
+    ("atk", "atk", "INTEGER"),
+    ("def", "def", "INTEGER"),
+    ("level", "level", "INTEGER"),
+    ("scale", "scale", "INTEGER"),
+    ("linkVal", "linkVal", "INTEGER"),
+    ("linkMarkers", "linkMarkers", "TEXT"),
+]
+LIMIT_FORMATS = ["ocg", "tcg", "md"]
+INDEXED_COLUMNS = ["id", "uniqueId", "name", "cardType", "attribute", "frameType"] + [
+    f"limit_{format_name}" for format_name in LIMIT_FORMATS
+]
+
+def column_names():
+    return ["key"] + [column for _, column, _ in CARD_COLUMNS] + [
+        f"limit_{format_name}" for format_name in LIMIT_FORMATS
+    ] + ["json"]
+
+def create_schema(conn):
+    columns = ",\n    ".join(
+        ["key TEXT PRIMARY KEY"]
+        + [f'"{column}" {sql_type}' for _, column, sql_type in CARD_COLUMNS]
+        + [f"limit_{format_name} TEXT" for format_name in LIMIT_FORMATS]
+        + ["json TEXT NOT NULL"]
+    )
+    conn.execute(f"CREATE TABLE cards (\n    {columns}\n)")
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+def card_row(key, card_obj):
+    row = [key]
+    for field, _, _ in CARD_COLUMNS:
+        value = card_obj.get(field)
+        if isinstance(value, (list, dict)):
+            # linkMarkers keeps its JSON form, e.g. '["top","bottom"]'.
+            value = json.dumps(value, ensure_ascii=False)
+        row.append(value)
+    limit = card_obj.get("limit")
+    if not isinstance(limit, dict):
+        limit = {}
+    row.extend(limit.get(format_name) for format_name in LIMIT_FORMATS)
+    row.append(json.dumps(as_dict(card_obj), ensure_ascii=False, sort_keys=True))
+    return row
+
+def export_cards_sqlite(card_items, db_path):
+    # Writes (key, card_obj) pairs to a fresh, indexed SQLite database at db_path, swapped in when complete.
+    # Returns the number of cards written.
+    tmp_path = db_path + ".part"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    names = column_names()
+    quoted = ", ".join(f'"{name}"' for name in names)
+    insert = f"INSERT INTO cards ({quoted}) VALUES ({', '.join('?' * len(names))})"
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # Nothing to recover if the build is interrupted, the .part file is simply rebuilt.
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        with conn:
+            create_schema(conn)
+            count = 0
+            batch = []
+            for key, card_obj in card_items:
+                batch.append(card_row(key, card_obj))
+                if len(batch) >= 1000:
+                    conn.executemany(insert, batch)
+                    count += len(batch)
+                    batch = []
+            conn.executemany(insert, batch)
+            count += len(batch)
+
+            # Indexes are built after the bulk insert, which is much faster than maintaining them row by row.
+            for column in INDEXED_COLUMNS:
+                conn.execute(f'CREATE INDEX idx_cards_{column} ON cards ("{column}")')
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("schema_version", str(SCHEMA_VERSION)),
+                ("card_count", str(count)),
+            ])
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    add_written(os.path.getsize(db_path))
+    print(f"Exported {count} cards to {db_path}.")
+    return count
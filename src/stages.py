@@ -0,0 +1,161 @@
+import os
+import json
+from .utils import write_json_atomic
+from .image_manifest import file_sha256
+
+# Entry points of the main.py subcommands (fetch, build, images, pack, verify).
+# Each stage imports what it needs inside the function, so local-only work such as a
+# build from cached sources or a verify never loads requests, urllib3 or the pools.
+
+TMP_DIR = "tmp"
+RES_DIR = "res"
+CACHE_DIR = ".cache"
+SOURCES_MANIFEST = "sources.manifest.json"
+
+def sources_manifest_path(tmp_dir):
+    return os.path.join(tmp_dir, SOURCES_MANIFEST)
+
+def source_files(tmp_dir, res_dir):
+    # Every intermediate a build reads: json1/json2 in tmp_dir, the resources in res_dir.
+    paths = [
+        os.path.join(tmp_dir, "json1.json"), os.path.join(tmp_dir, "json2.json"),
+        os.path.join(res_dir, "token.json"), os.path.join(res_dir, "typeline.conf")
+    ]
+    limited_dir = os.path.join(res_dir, "limited")
+    if os.path.isdir(limited_dir):
+        paths.extend(os.path.join(limited_dir, name) for name in sorted(os.listdir(limited_dir)))
+    return [path for path in paths if os.path.isfile(path)]
+
+def fetch_sources(tmp_dir=TMP_DIR, res_dir=RES_DIR, cache_dir=CACHE_DIR):
+    # Refreshes tmp_dir and res_dir concurrently through the HTTP cache and records sizes and SHA256 in
+    # tmp_dir/sources.manifest.json. Returns True if both card sources were fetched and verified.
+    import requests
+    from .scheduler import TaskGraph
+    from .resources import download_resources
+    from .data_manager import process_json1, process_json2
+
+    os.makedirs(tmp_dir, exist_ok=True)
+    manifest_path = sources_manifest_path(tmp_dir)
+    # A failed fetch leaves no manifest and no stale card sources behind to vouch for.
+    for path in [manifest_path, os.path.join(tmp_dir, "json1.json"), os.path.join(tmp_dir, "json2.json")]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    graph = TaskGraph()
+    graph.add("resources", lambda: download_resources(res_dir, cache_dir))
+    graph.add("json2", lambda: process_json2(tmp_dir, cache_dir))
+    graph.add("json1", lambda: process_json1(tmp_dir, cache_dir))
+    try:
+        graph.run()
+    except (OSError, requests.RequestException) as e:
+        print(f"Error fetching sources: {e}")
+        return False
+
+    for name in ["json1.json", "json2.json"]:
+        if not os.path.exists(os.path.join(tmp_dir, name)):
+            print(f"{name} could not be fetched.")
+            return False
+
+    files = {path: {"size": os.path.getsize(path), "sha256": file_sha256(path)} for path in source_files(tmp_dir, res_dir)}
+    write_json_atomic(manifest_path, {"files": files}, indent=2)
+    print(f"Fetched {len(files)} source files into {tmp_dir} and {res_dir}.")
+    return True
+
+def check_sources(tmp_dir=TMP_DIR, res_dir=RES_DIR):
+    # Returns None if the intermediates are exactly what the last fetch wrote, else the reason they are not.
+    manifest_path = sources_manifest_path(tmp_dir)
+    if not os.path.exists(manifest_path):
+        return f"{manifest_path} not found"
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            files = json.load(f)["files"]
+    except Exception as e:
+        return f"{manifest_path} is unreadable: {e}"
+
+    present = source_files(tmp_dir, res_dir)
+    for path in sorted(set(files) | set(present)):
+        recorded = files.get(path)
+        if recorded is None:
+            return f"{path} is not from the last fetch"
+        if not os.path.isfile(path):
+            return f"{path} is missing"
+        if os.path.getsize(path) != recorded["size"] or file_sha256(path) != recorded["sha256"]:
+            return f"{path} changed since it was fetched"
+    return None
+
+def build_from_sources(output_path, tmp_dir=TMP_DIR, res_dir=RES_DIR, cache_dir=CACHE_DIR, offline=False,
+                       **build_options):
+    # Builds output_path from the last fetch without the network, fetching first if the intermediates are
+    # missing or modified (unless offline). Returns True once output_path is written.
+    reason = check_sources(tmp_dir, res_dir)
+    if reason is None:
+        print(f"Reusing the sources in {tmp_dir} and {res_dir} from the last fetch.")
+    elif offline:
+        print(f"Cannot build offline: {reason}. Run the fetch stage first.")
+        return False
+    else:
+        print(f"Fetching sources first: {reason}.")
+        if not fetch_sources(tmp_dir, res_dir, cache_dir):
+            return False
+
+    from .card_processor import generate_cards_json
+    return generate_cards_json(tmp_dir, output_path, res_dir, **build_options)
+
+def verify_outputs(output_path, image_dir=None):
+    """
+    Checks the published artifacts without rewriting anything: every cards.json format
+    against its .sha256 sidecar, the offset index against cards.json, and, if image_dir
+    is given, every image against the image manifest. Returns True if all of them match.
+    """
+    from .card_outputs import OUTPUT_FORMATS, output_path_for, sha256_sidecar_path
+    from .card_store import CardStore, CardStoreError
+    from .image_manifest import load_manifest, manifest_path_for, plan_image_sync
+
+    if not os.path.exists(output_path):
+        print(f"Error: {output_path} not found.")
+        return False
+
+    problems = []
+    for output_format in OUTPUT_FORMATS:
+        path = output_path_for(output_path, output_format)
+        if not os.path.exists(path):
+            continue
+        sidecar = sha256_sidecar_path(path)
+        if not os.path.exists(sidecar):
+            problems.append(f"{sidecar} not found")
+            continue
+        with open(sidecar, 'r', encoding='utf-8') as f:
+            expected = f.read().split()[:1]
+        if expected != [file_sha256(path)]:
+            problems.append(f"{path} does not match {sidecar}")
+        else:
+            print(f"{path}: OK")
+
+    with CardStore(output_path) as store:
+        if store.offsets is None:
+            problems.append(f"offset index of {output_path} is missing or stale")
+        else:
+            try:
+                for key, card in store.items():
+                    if card.get("cardImage", key) != store.offsets[key][2]:
+                        raise CardStoreError(f"offset index of {output_path} has a stale cardImage for {key}")
+                print(f"Offset index of {output_path}: OK ({len(store)} cards)")
+            except (CardStoreError, ValueError) as e:
+                problems.append(str(e))
+        jobs = store.image_jobs()
+
+    if image_dir is not None:
+        if not os.path.isdir(image_dir):
+            problems.append(f"{image_dir} not found")
+        else:
+            plan = plan_image_sync(jobs, load_manifest(manifest_path_for(image_dir)), image_dir, verify=True)
+            pending = len(plan["download"]) + len(plan["adopt"])
+            if pending or plan["prune"]:
+                reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(plan["reasons"].items()))
+                problems.append(f"{image_dir} is out of sync with {output_path} ({reasons})")
+            else:
+                print(f"{image_dir}: OK ({plan['unchanged']} images)")
+
+    for problem in problems:
+        print(f"Error: {problem}")
+    return not problems
@@ -1,28 +1,209 @@
-import requests
+import io
+import os
+import json
+import time
 import hashlib
+from .instrumentation import add_written, record_request
+
+# requests is imported inside the download helpers, so modules that only need the JSON
+# helpers (offline builds, verify) do not load it.
+
+DOWNLOAD_TIMEOUT = (10, 60)
+DOWNLOAD_ATTEMPTS = 4
+
+def write_json_atomic(path, obj, indent=None, separators=None):
+    # Writes obj as sorted-key JSON to path.part and renames it over path, so readers never see half a file.
+    tmp_path = path + ".part"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=indent, separators=separators, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def load_json_or_default(path, default, description=None):
+    """
+    Returns the JSON value stored at path, or default if the file is missing, unreadable
+    or (for a non-None default) not of the same type. With a description, an unreadable
+    file is reported as "ignoring unreadable <description> <path>".
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f)
+    except Exception as e:
+        if description:
+            print(f"Warning: ignoring unreadable {description} {path}: {e}")
+        return default
+    if default is not None and not isinstance(value, type(default)):
+        return default
+    return value
+
+class HashingReader(io.RawIOBase):
+    """
+    Read-only stream wrapper that feeds every byte read from raw into the given hashes.
+    """
+
+    def __init__(self, raw, *hashes):
+        self.raw = raw
+        self.hashes = hashes
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        for hash_obj in self.hashes:
+            hash_obj.update(data)
+        return size
+
+    def drain(self, chunk_size=65536):
+        # Consume the rest of the stream so the digests cover all of it.
+        while self.read(chunk_size):
+            pass
+
+class FileSink:
+    # Adapts a writable file to the update() interface HashingReader feeds, to tee a stream to disk.
+
+    def __init__(self, f):
+        self.f = f
+
+    def update(self, data):
+        self.f.write(data)
+
+def load_resume_state(meta_path, url):
+    state = load_json_or_default(meta_path, {})
+    return state if state.get("url") == url else None
+
+def resume_validator(response):
+    # If-Range needs a strong ETag or a Last-Modified date, and ranges only line up
+    # with what we stored when the body was not content-encoded on the fly.
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+        return None
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+def hash_existing(path, hashes):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            for hash_obj in hashes:
+                hash_obj.update(chunk)
+
+def remove_partial(part_path, meta_path):
+    for path in [part_path, meta_path]:
+        if os.path.exists(path):
+            os.remove(path)
+
+def download_file(url, filepath, session=None, headers=None, attempts=DOWNLOAD_ATTEMPTS):
+    # Streams url into filepath.part, hashing it, resumes interrupted downloads with Range/If-Range and renames
+    # on success. Returns status, size, sha256, md5, etag and last_modified, or {"status": 304}.
+    import requests
 
-def download_file(url, filepath):
     print(f"Downloading {url} to {filepath}...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    with open(filepath, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    print("Download complete.")
+    if session is None:
+        session = requests
+
+    part_path = filepath + ".part"
+    meta_path = part_path + ".json"
+    state = load_resume_state(meta_path, url)
+    if state is None:
+        remove_partial(part_path, meta_path)
+
+    last_error = None
+    for attempt in range(1, attempts + 1):
+        request_headers = dict(headers or {})
+        offset = 0
+        if state and state.get("validator") and os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+            request_headers["If-Range"] = state["validator"]
+            # Conditional validators describe the full cached body, not this partial one.
+            request_headers.pop("If-None-Match", None)
+            request_headers.pop("If-Modified-Since", None)
+
+        request_start = time.perf_counter()
+        try:
+            with session.get(url, headers=request_headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code not in (200, 206):
+                    record_request(response.status_code, time.perf_counter() - request_start)
+                if response.status_code == 304:
+                    return {"status": 304}
+                if response.status_code == 416:
+                    remove_partial(part_path, meta_path)
+                    state = None
+                    continue
+                response.raise_for_status()
+
+                hash_sha256 = hashlib.sha256()
+                hash_md5 = hashlib.md5()
+                if response.status_code == 206 and offset:
+                    print(f"Resuming at byte {offset}...")
+                    hash_existing(part_path, [hash_sha256, hash_md5])
+                    mode = 'ab'
+                    size = offset
+                else:
+                    mode = 'wb'
+                    size = 0
+                    state = {"url": url, "validator": resume_validator(response)}
+                    write_json_atomic(meta_path, state)
+
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        f.write(chunk)
+                        hash_sha256.update(chunk)
+                        hash_md5.update(chunk)
+                        size += len(chunk)
+
+                record_request(response.status_code, time.perf_counter() - request_start, size - offset)
+                add_written(size - offset)
+                result = {
+                    "status": response.status_code,
+                    "size": size,
+                    "sha256": hash_sha256.hexdigest(),
+                    "md5": hash_md5.hexdigest(),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")
+                }
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            record_request(None, time.perf_counter() - request_start)
+            last_error = e
+            if attempt < attempts:
+                delay = 2 ** (attempt - 1)
+                print(f"Download interrupted ({e}). Retrying in {delay}s...")
+                time.sleep(delay)
+            continue
+
+        os.replace(part_path, filepath)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        print("Download complete.")
+        return result
+
+    raise last_error or requests.RequestException(f"Failed to download {url}")
+
+def verify_sha256(filepath, sha256_url, calculated_sha256=None):
+    import requests
 
-def verify_sha256(filepath, sha256_url):
     print(f"Verifying SHA256 for {filepath}...")
     # Download SHA256 content
+    request_start = time.perf_counter()
     response = requests.get(sha256_url)
+    record_request(response.status_code, time.perf_counter() - request_start, len(response.content))
     response.raise_for_status()
     expected_sha256 = response.text.strip().split()[0]
 
-    # Calculate file SHA256
-    hash_sha256 = hashlib.sha256()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_sha256.update(chunk)
-    calculated_sha256 = hash_sha256.hexdigest()
+    # Calculate file SHA256 unless the caller already hashed it while downloading
+    if calculated_sha256 is None:
+        hash_sha256 = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_sha256.update(chunk)
+        calculated_sha256 = hash_sha256.hexdigest()
 
     if calculated_sha256 == expected_sha256:
         print("SHA256 verification successful.")
@@ -31,19 +212,24 @@ def verify_sha256(filepath, sha256_url):
         print(f"SHA256 verification failed! Expected {expected_sha256}, got {calculated_sha256}")
         return False
 
-def verify_md5(filepath, md5_url):
+def verify_md5(filepath, md5_url, calculated_md5=None):
+    import requests
+
     print(f"Verifying MD5 for {filepath}...")
     # Download MD5 content
+    request_start = time.perf_counter()
     response = requests.get(md5_url)
+    record_request(response.status_code, time.perf_counter() - request_start, len(response.content))
     response.raise_for_status()
     expected_md5 = response.text.strip().split()[0].replace('"', '').replace("'", "")
 
-    # Calculate file MD5
-    hash_md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    calculated_md5 = hash_md5.hexdigest()
+    # Calculate file MD5 unless the caller already hashed it while decompressing
+    if calculated_md5 is None:
+        hash_md5 = hashlib.md5()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_md5.update(chunk)
+        calculated_md5 = hash_md5.hexdigest()
 
     if calculated_md5 == expected_md5:
         print("MD5 verification successful.")
@@ -0,0 +1,120 @@
+import os
+import time
+import random
+import requests
+from .cache import cached_download
+from .utils import load_json_or_default, write_json_atomic
+from .instrumentation import record_request
+from .image_engine import parse_retry_after
+from .resources import (
+    TOKEN_URL, TOKEN_SHA256_URL, LIMITED_URL, LIMITED_SHA256_URL, TYPELINE_URL, TYPELINE_SHA256_URL
+)
+from .data_manager import JSON1_URL, JSON2_ZIP_URL, JSON2_MD5_URL
+
+# Watch mode: poll each source with a tiny request (checksum sidecar, or HEAD for json1) and rebuild only
+# when one changed; polls are jittered and failures back off exponentially.
+
+STATE_FILENAME = "watch.json"
+PROBE_TIMEOUT = (10, 30)
+
+# name -> (url of the source, url of its checksum sidecar or None)
+SOURCES = {
+    "json1": (JSON1_URL, None),
+    "json2": (JSON2_ZIP_URL, JSON2_MD5_URL),
+    "token": (TOKEN_URL, TOKEN_SHA256_URL),
+    "limited": (LIMITED_URL, LIMITED_SHA256_URL),
+    "typeline": (TYPELINE_URL, TYPELINE_SHA256_URL),
+}
+
+def probe_request(method, url, session):
+    request_start = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=PROBE_TIMEOUT, allow_redirects=True)
+    except requests.RequestException:
+        record_request(None, time.perf_counter() - request_start)
+        raise
+    record_request(response.status_code, time.perf_counter() - request_start, len(response.content))
+    response.raise_for_status()
+    return response
+
+def probe_source(url, sidecar_url, session, cache_dir):
+    # Returns a short fingerprint of a source's upstream version: its checksum sidecar, HEAD validators or,
+    # as a last resort, a revalidation through the download cache.
+    if sidecar_url:
+        # Same parsing as verify_md5/verify_sha256.
+        text = probe_request("GET", sidecar_url, session).text.strip()
+        return "checksum:" + text.split()[0].replace('"', '').replace("'", "")
+    try:
+        headers = probe_request("HEAD", url, session).headers
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code not in (405, 501):
+            raise
+        headers = {}
+    if headers.get("ETag"):
+        return "etag:" + headers["ETag"]
+    if headers.get("Last-Modified"):
+        return "last-modified:" + headers["Last-Modified"]
+    _, entry, _ = cached_download(url, cache_dir, session)
+    return "sha256:" + entry["sha256"]
+
+def probe_sources(cache_dir, session=None):
+    # {source name: fingerprint} for every upstream source.
+    session = session or requests.Session()
+    return {name: probe_source(url, sidecar_url, session, cache_dir) for name, (url, sidecar_url) in SOURCES.items()}
+
+def load_watch_state(state_path):
+    return load_json_or_default(state_path, {}, "watch state")
+
+def save_watch_state(state_path, state):
+    write_json_atomic(state_path, state, indent=2)
+
+def next_delay(interval, failures, max_interval, jitter, retry_after=None):
+    # interval doubled per consecutive failure up to max_interval, spread by +-jitter; never before Retry-After.
+    delay = min(max_interval, interval * 2 ** failures) if failures else interval
+    delay *= 1 + jitter * (2 * random.random() - 1)
+    return max(delay, retry_after or 0)
+
+def watch(build, cache_dir, interval=900, max_interval=6 * 3600, jitter=0.2, once=False, sleep=time.sleep):
+    # Polls the sources every interval seconds and calls build() when one changed since the last successful
+    # build (kept in cache_dir/watch.json). Returns the last build result, None if none was needed, or False.
+    os.makedirs(cache_dir, exist_ok=True)
+    state_path = os.path.join(cache_dir, STATE_FILENAME)
+    session = requests.Session()
+    failures = 0
+    result = None
+    while True:
+        retry_after = None
+        try:
+            fingerprints = probe_sources(cache_dir, session)
+        except requests.RequestException as e:
+            failures += 1
+            result = False
+            response = getattr(e, "response", None)
+            if response is not None:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            print(f"Error polling upstream sources: {e}")
+        else:
+            built = load_watch_state(state_path).get("sources", {})
+            changed = [name for name in SOURCES if built.get(name) != fingerprints[name]]
+            if not changed:
+                print("Upstream sources unchanged.")
+                failures = 0
+            else:
+                print(f"Upstream changed: {', '.join(changed)}. Rebuilding...")
+                try:
+                    result = build()
+                except Exception as e:
+                    # A failed build must not end the watcher; it backs off like a failed poll.
+                    print(f"Error during build: {e}")
+                    result = False
+                if result:
+                    save_watch_state(state_path, {"sources": fingerprints, "built_at": time.time()})
+                    failures = 0
+                else:
+                    failures += 1
+                    print("Build failed; it will be retried on the next poll.")
+        if once:
+            return result
+        delay = next_delay(interval, failures, max_interval, jitter, retry_after)
+        print(f"Next poll in {delay:.0f}s.")
+        sleep(delay)